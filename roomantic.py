@@ -15,13 +15,25 @@
 #
 #  ***** END GPL LICENSE BLOCK *****
 
-from bpy_extras.io_utils import ImportHelper
+from bpy_extras.io_utils import ExportHelper, ImportHelper
+import argparse
 import bmesh
 import bpy
+import cProfile
+import hashlib
+import json
 import math
+import numpy as np
 import os
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
 from copy import copy
 import time
+import zipfile
 
 
 bl_info = {
@@ -40,70 +52,196 @@ bl_info = {
 # FUNCS
 
 
-class Point:
-    def __init__(self, x, y, z) -> None:
-        self.x = x
-        self.y = y
-        self.z = z
-
-
 class Bounds:
-    def __init__(self) -> None:
-        self.min = None
-        self.max = None
+    # min/max are float64 xyz arrays
+    __slots__ = ('min', 'max')
 
-    def encapsulate(self, p: Point):
-        # min
-        if self.min == None:
-            self.min = Point(p.x, p.y, p.z)
-        else:
-            if p.x < self.min.x:
-                self.min.x = p.x
-            if p.y < self.min.y:
-                self.min.y = p.y
-            if p.z < self.min.z:
-                self.min.z = p.z
-
-        # max
-        if self.max == None:
-            self.max = Point(p.x, p.y, p.z)
-        else:
-            if p.x > self.max.x:
-                self.max.x = p.x
-            if p.y > self.max.y:
-                self.max.y = p.y
-            if p.z > self.max.z:
-                self.max.z = p.z
+    def __init__(self, min=None, max=None) -> None:
+        self.min = None if min is None else np.array(min, dtype=np.float64)
+        self.max = None if max is None else np.array(max, dtype=np.float64)
 
     def expand(self, f):
-        self.min.x -= f
-        self.min.y -= f
-        self.min.z -= f
-        self.max.x += f
-        self.max.y += f
-        self.max.z += f
+        self.min -= f
+        self.max += f
 
     def intersect(self, other):
-        return (
-            self.min.x <= other.max.x and
-            self.max.x >= other.min.x and
-            self.min.y <= other.max.y and
-            self.max.y >= other.min.y and
-            self.min.z <= other.max.z and
-            self.max.z >= other.min.z)
+        return bool(
+            (self.min <= other.max).all() and
+            (self.max >= other.min).all())
+
+    def to_tuple(self):
+        return tuple(self.min.tolist() + self.max.tolist())
+
+    @staticmethod
+    def from_tuple(t):
+        return Bounds(t[0:3], t[3:6])
+
+
+def stack_bounds(boundsList):
+    # (n, 6) array of min xyz + max xyz so many bounds can be tested at once
+    packed = np.empty((len(boundsList), 6), dtype=np.float64)
+    for i, bounds in enumerate(boundsList):
+        packed[i, 0:3] = bounds.min
+        packed[i, 3:6] = bounds.max
+    return packed
+
+
+def intersect_stacked(packed, bounds):
+    # mask of the packed bounds intersecting bounds
+    return (
+        (packed[:, 0:3] <= bounds.max).all(axis=1) &
+        (packed[:, 3:6] >= bounds.min).all(axis=1))
+
+
+def get_mesh_coords(mesh):
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', coords)
+    return coords.reshape(-1, 3)
+
+
+def transform_coords(mat, coords):
+    mat = np.array(mat, dtype=np.float64)
+    return coords @ mat[0:3, 0:3].T + mat[0:3, 3]
 
 
 def calculate_bounds_ws(mat, mesh, expand):
-    bounds = Bounds()
-    for v in mesh.vertices:
-        pointWS = mat @ v.co
-        bounds.encapsulate(Point(pointWS.x, pointWS.y, pointWS.z))
+    coordsWS = transform_coords(mat, get_mesh_coords(mesh))
+    if len(coordsWS) == 0:
+        coordsWS = transform_coords(mat, np.zeros((1, 3)))
+    bounds = Bounds(coordsWS.min(axis=0), coordsWS.max(axis=0))
     bounds.expand(expand)
     return bounds
 
 
+# shapes touching more cells than this are tested against everything instead
+grid_max_cells = 64
+
+
+def build_intersection_map(shapeBounds):
+    # broad-phase on a uniform grid: only bounds sharing a cell get tested
+    intersections = {shape: set() for shape in shapeBounds}
+    if len(shapeBounds) == 0:
+        return intersections
+
+    shapes = list(shapeBounds)
+    packed = stack_bounds([shapeBounds[shape] for shape in shapes])
+
+    # cell size from the average extent, so most shapes touch a few cells
+    cellSize = max(
+        (packed[:, 3:6] - packed[:, 0:3]).max(axis=1).mean(), 1e-6)
+    cellMin = np.floor(packed[:, 0:3] / cellSize).astype(np.int64)
+    cellMax = np.floor(packed[:, 3:6] / cellSize).astype(np.int64)
+    cellCounts = (cellMax - cellMin + 1).prod(axis=1)
+
+    cells = {}
+    for i in np.flatnonzero(cellCounts <= grid_max_cells).tolist():
+        minX, minY, minZ = cellMin[i].tolist()
+        maxX, maxY, maxZ = cellMax[i].tolist()
+        for x in range(minX, maxX + 1):
+            for y in range(minY, maxY + 1):
+                for z in range(minZ, maxZ + 1):
+                    cell = (x, y, z)
+                    if cell in cells:
+                        cells[cell].append(i)
+                    else:
+                        cells[cell] = [i]
+
+    # pairs inside each cell, tested on plain floats
+    # cells list shapes in ascending order, so i < j and the key i * n + j is unique
+    count = len(shapes)
+    boxes = packed.tolist()
+    pairs = set()
+    for cellShapes in cells.values():
+        for n, i in enumerate(cellShapes):
+            box0 = boxes[i]
+            for j in cellShapes[n + 1:]:
+                key = i * count + j
+                if key in pairs:
+                    continue
+                box1 = boxes[j]
+                if (box0[0] <= box1[3] and box0[3] >= box1[0] and
+                        box0[1] <= box1[4] and box0[4] >= box1[1] and
+                        box0[2] <= box1[5] and box0[5] >= box1[2]):
+                    pairs.add(key)
+
+    for key in pairs:
+        shape0 = shapes[key // count]
+        shape1 = shapes[key % count]
+        intersections[shape0].add(shape1)
+        intersections[shape1].add(shape0)
+
+    # oversized shapes against everything at once
+    for i in np.flatnonzero(cellCounts > grid_max_cells).tolist():
+        for j in np.flatnonzero(intersect_stacked(packed, shapeBounds[shapes[i]])).tolist():
+            if i != j:
+                intersections[shapes[i]].add(shapes[j])
+                intersections[shapes[j]].add(shapes[i])
+
+    return intersections
+
+
+def _build_intersection_map_all_pairs(shapeBounds):
+    # the old all-pairs loop on per-axis floats, kept as the benchmark reference
+    boxes = {shape: bounds.to_tuple() for shape, bounds in shapeBounds.items()}
+    intersections = {shape: [] for shape in shapeBounds}
+    for shape0 in shapeBounds:
+        for shape1 in shapeBounds:
+            if shape0 == shape1:
+                continue
+            if shape1 in intersections[shape0]:
+                continue
+            box0 = boxes[shape0]
+            box1 = boxes[shape1]
+            if (box0[0] <= box1[3] and box0[3] >= box1[0] and
+                    box0[1] <= box1[4] and box0[4] >= box1[1] and
+                    box0[2] <= box1[5] and box0[5] >= box1[2]):
+                intersections[shape0].append(shape1)
+                if shape0 not in intersections[shape1]:
+                    intersections[shape1].append(shape0)
+    return intersections
+
+
+def _random_level_bounds(count, seed=0):
+    # rooms on a jittered grid, roughly what a sector map looks like
+    rand = random.Random(seed)
+    side = math.ceil(math.sqrt(count))
+    shapeBounds = {}
+    for i in range(count):
+        x = (i % side) * 4 + rand.uniform(-0.5, 0.5)
+        y = (i // side) * 4 + rand.uniform(-0.5, 0.5)
+        z = rand.uniform(-0.5, 0.5)
+        shapeBounds[i] = Bounds.from_tuple((
+            x, y, z,
+            x + rand.uniform(2, 6), y + rand.uniform(2, 6), z + rand.uniform(2, 6)))
+    return shapeBounds
+
+
+def benchmark_intersection_map(counts=(100, 1000, 5000)):
+    results = []
+    for count in counts:
+        shapeBounds = _random_level_bounds(count)
+
+        start = time.time()
+        grid = build_intersection_map(shapeBounds)
+        gridTime = time.time() - start
+
+        start = time.time()
+        allPairs = _build_intersection_map_all_pairs(shapeBounds)
+        allPairsTime = time.time() - start
+
+        for shape in shapeBounds:
+            if grid[shape] != set(allPairs[shape]):
+                raise RuntimeError(
+                    "roomantic: intersection map mismatch for {}".format(shape))
+
+        print("roomantic: intersection map {} shapes - grid {:.4f} sec. / all pairs {:.4f} sec.".format(
+            count, gridTime, allPairsTime))
+        results.append((count, gridTime, allPairsTime))
+    return results
+
+
 def _update_sector_solidify(self, context):
-    update_sector2d_solidify(context.active_object)
+    update_sector2d_solidify(self)
 
 
 def update_sector2d_solidify(shape):
@@ -217,18 +355,25 @@ def update_sector2d(shape):
         shape.material_slots[2].material = bpy.data.materials[shape.rmtc_wall_texture]
 
 
+def round_coords(coords, precision):
+    # round in double so rounding an already rounded float32 is a no-op
+    return np.round(coords.astype(np.float64), precision).astype(np.float32)
+
+
 def update_shape_precision(shape):
-    shape.location.x = round(
-        shape.location.x, bpy.context.scene.rmtc_precision)
-    shape.location.y = round(
-        shape.location.y, bpy.context.scene.rmtc_precision)
-    shape.location.z = round(
-        shape.location.z, bpy.context.scene.rmtc_precision)
+    # only write back when something moved, so clean shapes stay untouched
+    precision = bpy.context.scene.rmtc_precision
 
-    for v in shape.data.vertices:
-        v.co.x = round(v.co.x, bpy.context.scene.rmtc_precision)
-        v.co.y = round(v.co.y, bpy.context.scene.rmtc_precision)
-        v.co.z = round(v.co.z, bpy.context.scene.rmtc_precision)
+    location = np.array(shape.location, dtype=np.float32)
+    roundedLocation = round_coords(location, precision)
+    if not np.array_equal(location, roundedLocation):
+        shape.location = roundedLocation.tolist()
+
+    coords = get_mesh_coords(shape.data)
+    roundedCoords = round_coords(coords, precision)
+    if not np.array_equal(coords, roundedCoords):
+        shape.data.vertices.foreach_set('co', roundedCoords.ravel())
+        shape.data.update()
 
 
 def update_shape(shape):
@@ -241,15 +386,206 @@ def update_shape(shape):
             update_sector2d(shape)
 
 
-def get_shapes(collections):
-    shapes = []
-    for col in collections:
-        for obj in col.all_objects:
-            if obj.rmtc_shape_type != None:
-                if obj.rmtc_shape_type != 'NONE':
-                    if obj not in shapes:
-                        shapes.append(obj)
-    return shapes
+class ShapeRegistry:
+    # shapes of the scene and which of them changed since the last build,
+    # kept up to date by a depsgraph handler so builds don't have to rescan or re-fingerprint everything
+    # names only: objects don't survive undo, and any doubt makes the next build check everything
+
+    def __init__(self) -> None:
+        self.sceneName = None
+        self.precision = None
+        self.shapeNames = set()
+        self.dirtyNames = set()
+        self.materialNames = {}
+        self.valid = False
+        self.paused = False
+
+    def invalidate(self):
+        self.valid = False
+        self.shapeNames.clear()
+        self.dirtyNames.clear()
+        self.materialNames.clear()
+
+    def on_depsgraph_update(self, depsgraph):
+        # returns the names of the shapes that changed
+        changedNames = set()
+        if self.paused:
+            return changedNames
+        for update in depsgraph.updates:
+            if not isinstance(update.id, bpy.types.Object):
+                continue
+            obj = update.id.original
+            if is_shape(obj):
+                changedNames.add(obj.name)
+            elif obj.name in self.shapeNames:
+                self.shapeNames.discard(obj.name)
+                self.dirtyNames.discard(obj.name)
+        if self.valid:
+            self.shapeNames |= changedNames
+            self.dirtyNames |= changedNames
+        return changedNames
+
+    def get_shapes(self, scene):
+        # returns shapes sorted by name + the ones that may have changed, or None when all may have
+        if not self.valid or self.sceneName != scene.name or self.precision != scene.rmtc_precision:
+            self.sceneName = scene.name
+            self.precision = scene.rmtc_precision
+            self.shapeNames = {obj.name for obj in scene.objects if is_shape(obj)}
+            self.dirtyNames.clear()
+            self.valid = True
+            return [scene.objects[name] for name in sorted(self.shapeNames)], None
+
+        # a missing name is a delete or a rename the handler did not see, rescan and treat new names as changed
+        objects = scene.objects
+        if any(name not in objects or not is_shape(objects[name]) for name in self.shapeNames):
+            shapeNames = {obj.name for obj in objects if is_shape(obj)}
+            self.dirtyNames = (self.dirtyNames | (
+                shapeNames - self.shapeNames)) & shapeNames
+            self.shapeNames = shapeNames
+
+        # material renames don't show up as shape updates, compare the slot names
+        for name in self.shapeNames:
+            if self.materialNames.get(name) != get_material_names(objects[name]):
+                self.dirtyNames.add(name)
+
+        return [objects[name] for name in sorted(self.shapeNames)], {objects[name] for name in self.dirtyNames}
+
+    def mark_built(self, shapes):
+        for shape in shapes:
+            self.dirtyNames.discard(shape.name)
+            self.materialNames[shape.name] = get_material_names(shape)
+
+
+def get_material_names(shape):
+    return tuple(m.name if m else None for m in shape.data.materials)
+
+
+shape_registry = ShapeRegistry()
+
+
+@bpy.app.handlers.persistent
+def _on_depsgraph_update(scene, depsgraph):
+    changedNames = shape_registry.on_depsgraph_update(depsgraph)
+    if scene.rmtc_live_build and len(changedNames) > 0:
+        live_builder.queue(scene, changedNames)
+
+
+@bpy.app.handlers.persistent
+def _on_registry_reset(*args):
+    shape_registry.invalidate()
+
+
+# shape props that change the generated room
+fingerprint_props = [
+    'rmtc_shape_type',
+    'rmtc_ceiling_height',
+    'rmtc_floor_height',
+    'rmtc_shape_auto_texture',
+    'rmtc_floor_texture',
+    'rmtc_wall_texture',
+    'rmtc_ceiling_texture',
+    'rmtc_ceiling_texture_scale_offset',
+    'rmtc_wall_texture_scale_offset',
+    'rmtc_floor_texture_scale_offset',
+    'rmtc_ceiling_texture_rotation',
+    'rmtc_wall_texture_rotation',
+    'rmtc_floor_texture_rotation',
+]
+
+
+def get_build_settings(scene):
+    # scene options the room geometry depends on
+    return (
+        scene.rmtc_precision,
+        scene.rmtc_remove_material,
+        scene.rmtc_multi_operand,
+        scene.rmtc_convex_csg,
+        scene.rmtc_narrow_phase,
+        scene.rmtc_solver_policy,
+        scene.rmtc_vectorized_texture,
+        scene.rmtc_weld,
+        scene.rmtc_vertex_cache,
+        scene.rmtc_vertex_cache_size,
+    )
+
+
+def get_build_settings_key(scene):
+    return hashlib.blake2b(repr(get_build_settings(scene)).encode(), digest_size=16).hexdigest()
+
+
+def get_modifier_settings(mod):
+    # rna values of a modifier, ui state left out, objects by name + transform
+    settings = [mod.type]
+    for prop in mod.bl_rna.properties:
+        name = prop.identifier
+        if prop.type == 'COLLECTION' or name in ('rna_type', 'name', 'is_active', 'is_override_data') or \
+                (name.startswith('show_') and name != 'show_viewport'):
+            continue
+        value = getattr(mod, name, None)
+        if prop.type == 'POINTER':
+            if isinstance(value, bpy.types.Object):
+                value = (value.name, tuple(tuple(row) for row in value.matrix_world))
+            else:
+                value = getattr(value, 'name', None)
+        elif hasattr(value, '__len__') and not isinstance(value, str):
+            value = tuple(value)
+        settings.append((name, value))
+    return settings
+
+
+def calculate_shape_fingerprint(shape):
+    mesh = shape.data
+    fingerprint = hashlib.blake2b(digest_size=16)
+
+    # mesh data
+    fingerprint.update(get_mesh_coords(mesh).tobytes())
+    loopVerts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVerts)
+    fingerprint.update(loopVerts.tobytes())
+    loopTotals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loopTotals)
+    fingerprint.update(loopTotals.tobytes())
+    materialIndices = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('material_index', materialIndices)
+    fingerprint.update(materialIndices.tobytes())
+
+    # transform
+    fingerprint.update(
+        repr([tuple(row) for row in shape.matrix_world]).encode())
+
+    # props + materials + modifiers
+    for name in fingerprint_props:
+        value = getattr(shape, name)
+        if hasattr(value, '__len__') and not isinstance(value, str):
+            value = tuple(value)
+        fingerprint.update(repr(value).encode())
+    for m in mesh.materials:
+        fingerprint.update(repr(m.name if m else None).encode())
+    for mod in shape.modifiers:
+        fingerprint.update(repr(get_modifier_settings(mod)).encode())
+
+    # build settings
+    fingerprint.update(get_build_settings_key(bpy.context.scene).encode())
+
+    return fingerprint.hexdigest()
+
+
+def get_shape_neighbours(shape):
+    if shape.rmtc_neighbours == '':
+        return []
+    return json.loads(shape.rmtc_neighbours)
+
+
+def set_shape_neighbours(shape, neighbours):
+    shape.rmtc_neighbours = json.dumps(sorted(n.name for n in neighbours))
+
+
+def get_shape_boolean(shape, shapeBooleans):
+    if shape not in shapeBooleans:
+        shapeBoolean = eval_shape(shape, 'boolean_')
+        make_shape_boolean(shapeBoolean)
+        shapeBooleans[shape] = shapeBoolean
+    return shapeBooleans[shape]
 
 
 def copy_materials(source, target):
@@ -306,44 +642,345 @@ def make_shape_boolean(shape):
     shape.data.materials[0] = bpy.data.materials[bpy.context.scene.rmtc_remove_material]
 
 
-def apply_csg(target, boolean, operation):
-    bpy.ops.object.select_all(action='DESELECT')
-    bpy.context.view_layer.objects.active = target
-    target.select_set(True)
+def bake_modifiers(obj):
+    # evaluate the modifier stack and write the result into the object mesh
+    # no selection, active object or mode switch involved
+    dg = bpy.context.evaluated_depsgraph_get()
+    mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(dg))
+    obj.modifiers.clear()
 
+    oldMesh = obj.data
+    obj.data = mesh
+    if oldMesh.users == 0:
+        meshName = oldMesh.name
+        bpy.data.meshes.remove(oldMesh)
+        mesh.name = meshName
+
+
+def apply_csg(target, boolean, operation, solver='EXACT'):
     mod = target.modifiers.new(name='boolean', type='BOOLEAN')
     mod.object = boolean
+    mod.solver = solver
+    mod.operation = operation
+    bake_modifiers(target)
+
+
+def apply_csg_multi(target, booleans, operation, solver='EXACT'):
+    # all operands in one solver run, through a temporary collection operand
+    # the fast solver only takes object operands, so it goes one by one
+    if len(booleans) == 1 or solver == 'FAST':
+        for boolean in booleans:
+            apply_csg(target, boolean, operation, solver)
+        return
+
+    collection = bpy.data.collections.new('rmtc_operands')
+    for boolean in booleans:
+        collection.objects.link(boolean)
+
+    mod = target.modifiers.new(name='boolean', type='BOOLEAN')
+    mod.operand_type = 'COLLECTION'
+    mod.collection = collection
     mod.solver = 'EXACT'
     mod.operation = operation
-    bpy.ops.object.modifier_apply(modifier='boolean')
+    bake_modifiers(target)
+
+    bpy.data.collections.remove(collection)
+
+
+def get_edge_uses(mesh):
+    edgeIndices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('edge_index', edgeIndices)
+    return np.bincount(edgeIndices, minlength=len(mesh.edges))
+
+
+def get_mesh_volume(mesh):
+    # signed volume of a closed mesh, sum of the polygon fans against the origin
+    loopTotals, loopOrder, loopPolygons = get_polygon_loops(mesh)
+    if len(loopTotals) == 0:
+        return 0.0
+    loopVerts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVerts)
+    points = get_mesh_coords(mesh).astype(np.float64)[loopVerts[loopOrder]]
+
+    loopStarts = np.cumsum(loopTotals) - loopTotals
+    following = np.arange(1, len(points) + 1)
+    following[loopStarts + loopTotals - 1] = loopStarts
+    areas = np.add.reduceat(
+        np.cross(points, points[following]), loopStarts, axis=0)
+    return float((areas * points[loopStarts]).sum() / 6)
+
+
+def is_csg_valid(mesh, volumeBefore, operation, removeMaterialIndex):
+    # cheap checks of a fast solver result: closed, sane volume and
+    # remove faces wherever the volume changed
+    if len(mesh.polygons) < 4 or (get_edge_uses(mesh) != 2).any():
+        return False
+
+    volume = get_mesh_volume(mesh)
+    tolerance = 1e-4 * max(abs(volume), abs(volumeBefore)) + 1e-9
+    if volume <= tolerance:
+        return False
+    if operation == 'UNION' and volume < volumeBefore - tolerance:
+        return False
+    if operation == 'INTERSECT' and volume > volumeBefore + tolerance:
+        return False
+
+    if abs(volume - volumeBefore) > tolerance:
+        materialIndices = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get('material_index', materialIndices)
+        if not (materialIndices == removeMaterialIndex).any():
+            return False
+    return True
+
+
+def apply_csg_operations(target, operations, solver, removeMaterialIndex):
+    # returns False when a fast solver result fails validation, target is then left half done
+    for booleans, operation in operations:
+        volumeBefore = get_mesh_volume(target.data)
+        apply_csg_multi(target, booleans, operation, solver)
+        if solver == 'FAST' and not is_csg_valid(target.data, volumeBefore, operation, removeMaterialIndex):
+            return False
+    return True
+
+
+def box_geometry(center, size):
+    hx, hy, hz = size[0] / 2, size[1] / 2, size[2] / 2
+    cx, cy, cz = center
+    verts = [(cx + x * hx, cy + y * hy, cz + z * hz)
+             for z in (-1, 1) for y in (-1, 1) for x in (-1, 1)]
+    faces = [(0, 2, 3, 1), (4, 5, 7, 6), (0, 1, 5, 4),
+             (2, 6, 7, 3), (0, 4, 6, 2), (1, 3, 7, 5)]
+    return verts, faces
+
+
+def create_box_obj(name, center, size):
+    obj = create_mesh_obj(name)
+    verts, faces = box_geometry(center, size)
+    obj.data.from_pydata(verts, [], faces)
+    obj.data.update()
+    return obj
 
 
-def apply_remove_material(shape):
-    bpy.ops.object.select_all(action='DESELECT')
-    bpy.context.view_layer.objects.active = shape
-    shape.select_set(True)
+def benchmark_multi_operand(counts=(4, 8, 16)):
+    # a long room cut by count boxes: sequential chain vs one collection boolean
+    scene = bpy.context.scene
+    results = []
+    for count in counts:
+        times = []
+        for multi in (False, True):
+            room = create_box_obj('rmtc_benchmark_room',
+                                  (0, 0, 0), (count * 2, 4, 4))
+            scene.collection.objects.link(room)
+            booleans = [create_box_obj('rmtc_benchmark_boolean', (i * 2 - count + 1, 2, 0), (1, 2, 2))
+                        for i in range(count)]
+
+            start = time.time()
+            if multi:
+                apply_csg_multi(room, booleans, 'UNION')
+            else:
+                for boolean in booleans:
+                    apply_csg(room, boolean, 'UNION')
+            times.append(time.time() - start)
 
-    if bpy.context.scene.rmtc_remove_material != "":
-        remove = False
-        for i, m in enumerate(shape.material_slots):
-            if bpy.context.scene.rmtc_remove_material == m.name:
-                shape.active_material_index = i
-                bpy.ops.object.editmode_toggle()
-                bpy.ops.mesh.select_all(action='DESELECT')
-                bpy.ops.object.material_slot_select()
-                bpy.ops.mesh.delete(type='FACE')
-                bpy.ops.object.editmode_toggle()
-                bpy.ops.object.material_slot_remove()
+            for obj in [room] + booleans:
+                mesh = obj.data
+                bpy.data.objects.remove(obj, do_unlink=True)
+                bpy.data.meshes.remove(mesh)
 
+        print("roomantic: {} operands - sequential {:.4f} sec. / multi-operand {:.4f} sec. ({:.1f}x)".format(
+            count, times[0], times[1], times[0] / max(times[1], 1e-9)))
+        results.append((count, times[0], times[1]))
+    return results
 
-def flip_normals(shape):
-    bpy.ops.object.select_all(action='DESELECT')
-    bpy.context.view_layer.objects.active = shape
-    shape.select_set(True)
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action='SELECT')
-    bpy.ops.mesh.flip_normals()
-    bpy.ops.object.mode_set(mode='OBJECT')
+
+def get_add_material(name):
+    if name in bpy.data.materials:
+        return bpy.data.materials[name]
+    return bpy.data.materials.new(name)
+
+
+def create_shape(collection, name, shapeType, verts, faces, location):
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(verts, [], faces)
+    mesh.update()
+    shape = bpy.data.objects.new(name, mesh)
+    shape.location = location
+    collection.objects.link(shape)
+    shape.rmtc_shape_type = shapeType
+    initialize_shape(shape)
+    return shape
+
+
+def generate_level(scene, count, layout='GRID', seed=0):
+    # procedural test level of count shapes: sector2d rooms, some sector3d rooms
+    # and brush pillars, either on a grid of touching rooms or along a corridor
+    rand = random.Random(seed)
+    floorMaterial = get_add_material('rmtc_generated_floor')
+    wallMaterial = get_add_material('rmtc_generated_wall')
+    ceilingMaterial = get_add_material('rmtc_generated_ceiling')
+
+    side = max(math.ceil(math.sqrt(count)), 1)
+    shapes = []
+    roomIndex = 0
+    lastRoom = (0, 0, 0, 4)
+    for i in range(count):
+        name = 'generated_{}'.format(i)
+
+        # brush pillar in the middle of the last room
+        if i % 5 == 4:
+            x, y, floor, height = lastRoom
+            verts, faces = box_geometry((0, 0, 0), (0.5, 0.5, height))
+            shape = create_shape(scene.collection, name, 'BRUSH', verts, faces,
+                                 (x, y, floor + height / 2))
+            shapes.append(shape)
+            continue
+
+        # room footprint
+        if layout == 'CORRIDOR':
+            # rooms of 6x6 joined by 4x2 corridors along x
+            x = (roomIndex // 2) * 10 + (5 if roomIndex % 2 == 1 else 0)
+            y = 0
+            hx, hy = (2, 1) if roomIndex % 2 == 1 else (3, 3)
+        else:
+            x = (roomIndex % side) * 4
+            y = (roomIndex // side) * 4
+            hx, hy = 2, 2
+        floor = rand.choice([0, 0.25, 0.5])
+        height = rand.choice([3, 4])
+        roomIndex += 1
+        lastRoom = (x, y, floor, height)
+
+        if i % 7 == 3:
+            verts, faces = box_geometry((0, 0, 0), (hx * 2, hy * 2, height))
+            shape = create_shape(scene.collection, name, 'SECTOR3D', verts, faces,
+                                 (x, y, floor + height / 2))
+            for material in (ceilingMaterial, floorMaterial, wallMaterial):
+                shape.data.materials.append(material)
+        else:
+            verts = [(-hx, -hy, 0), (hx, -hy, 0), (hx, hy, 0), (-hx, hy, 0)]
+            shape = create_shape(scene.collection, name, 'SECTOR2D', verts, [(0, 1, 2, 3)],
+                                 (x, y, 0))
+            shape.rmtc_floor_texture = floorMaterial.name
+            shape.rmtc_wall_texture = wallMaterial.name
+            shape.rmtc_ceiling_texture = ceilingMaterial.name
+            shape.rmtc_floor_height = floor
+            shape.rmtc_ceiling_height = floor + height
+
+        update_shape(shape)
+        shapes.append(shape)
+
+    return shapes
+
+
+def clear_level():
+    # remove every object, mesh and ROOMantic collection of the file
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for col in list(bpy.data.collections):
+        if col.name.startswith('ROOMantic_'):
+            bpy.data.collections.remove(col)
+    shape_registry.invalidate()
+
+
+def room_checksum(room):
+    # geometry hash, rounded so float noise does not count as a change
+    arrays = mesh_to_arrays(room.data)
+    checksum = hashlib.blake2b(digest_size=16)
+    checksum.update((np.round(arrays['co'].astype(np.float64), 4) + 0.0).tobytes())
+    checksum.update(arrays['loop_totals'].tobytes())
+    checksum.update(arrays['loop_verts'].tobytes())
+    checksum.update(arrays['material_indices'].tobytes())
+    if 'uv' in arrays:
+        checksum.update((np.round(arrays['uv'].astype(np.float64), 4) + 0.0).tobytes())
+    checksum.update(repr(arrays['materials'].tolist()).encode())
+    checksum.update((np.round(np.array(room.matrix_world), 4) + 0.0).tobytes())
+    return checksum.hexdigest()
+
+
+def level_checksum(levelCollection):
+    checksum = hashlib.blake2b(digest_size=16)
+    for room in sorted(levelCollection.objects, key=lambda obj: obj.name):
+        checksum.update((room.name + room_checksum(room)).encode())
+    return checksum.hexdigest()
+
+
+def run_benchmark(context, sizes, layout='GRID', reportDir='', reference=''):
+    # build generated levels of increasing size, then rebuild after a one-vertex tweak
+    # checksums are compared against a reference report, returns the mismatching runs
+    results = {
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'blender': bpy.app.version_string,
+        'layout': layout,
+        'runs': [],
+    }
+    for size in sizes:
+        clear_level()
+        shapes = generate_level(context.scene, size, layout)
+
+        profiler = BuildProfiler()
+        build_level_paused(context, False, [], profiler)
+        profiler.finish()
+
+        levelCollection = bpy.data.collections['ROOMantic_LEVEL']
+        rooms = list(levelCollection.objects)
+        run = {
+            'shapes': size,
+            'rooms': len(rooms),
+            'verts': sum(len(room.data.vertices) for room in rooms),
+            'faces': sum(len(room.data.polygons) for room in rooms),
+            'total_seconds': profiler.total,
+            'phases': {phase['name']: phase['seconds'] for phase in profiler.phases},
+            'checksum': level_checksum(levelCollection),
+        }
+
+        # incremental rebuild after moving one vertex
+        shape = shapes[0]
+        shape.data.vertices[0].co.x -= 0.5
+        shape.data.update()
+        profiler = BuildProfiler()
+        build_level_paused(context, False, [], profiler)
+        profiler.finish()
+        run['incremental_seconds'] = profiler.total
+        run['incremental_rooms'] = profiler.counters.get('rebuilt rooms', 0)
+
+        results['runs'].append(run)
+
+    print("roomantic: benchmark {}".format(layout))
+    for run in results['runs']:
+        print("roomantic: {:>6} shapes - build {:8.3f} sec. - incremental {:8.3f} sec. ({} rooms) - {}".format(
+            run['shapes'], run['total_seconds'], run['incremental_seconds'], run['incremental_rooms'], run['checksum']))
+
+    # correctness against an earlier report
+    mismatches = []
+    if reference != '':
+        with open(reference) as f:
+            referenceRuns = {
+                run['shapes']: run for run in json.load(f)['runs']}
+        for run in results['runs']:
+            referenceRun = referenceRuns.get(run['shapes'])
+            if referenceRun is not None and referenceRun['checksum'] != run['checksum']:
+                mismatches.append(run['shapes'])
+                print("roomantic: checksum mismatch for {} shapes".format(
+                    run['shapes']))
+
+    if reportDir != '':
+        os.makedirs(reportDir, exist_ok=True)
+        path = os.path.join(reportDir, 'roomantic_benchmark_{}.json'.format(
+            time.strftime('%Y%m%d_%H%M%S')))
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=1)
+        print("roomantic: benchmark report - " + path)
+
+    return mismatches
+
+
+def get_remove_material_indices(shape):
+    removeMaterial = bpy.context.scene.rmtc_remove_material
+    if removeMaterial == "":
+        return []
+    return [i for i, m in enumerate(shape.data.materials) if m is not None and m.name == removeMaterial]
 
 
 def translate(val, t):
@@ -362,14 +999,10 @@ def rotate2D(uv, degrees):
     return newUV
 
 
-def apply_auto_texture(shape, eval):
-    mesh = eval.data
+def auto_texture_bmesh(shape, bm):
     objectLocation = shape.location
     objectScale = shape.scale
 
-    bm = bmesh.new()
-    bm.from_mesh(mesh)
-
     uv_layer = bm.loops.layers.uv.verify()
     for f in bm.faces:
         nX = f.normal.x
@@ -449,19 +1082,2543 @@ def apply_auto_texture(shape, eval):
                 luv.uv.y = translate(scale(
                     luv.uv.y, shape.rmtc_ceiling_texture_scale_offset[1]), shape.rmtc_ceiling_texture_scale_offset[3])
 
+
+def get_polygon_loops(mesh):
+    # polygon loop_totals + the loop indices in polygon order + polygon index per loop
+    polyCount = len(mesh.polygons)
+    loopStarts = np.empty(polyCount, dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', loopStarts)
+    loopTotals = np.empty(polyCount, dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loopTotals)
+    firstLoops = np.cumsum(loopTotals) - loopTotals
+    loopOrder = np.repeat(loopStarts - firstLoops, loopTotals) + \
+        np.arange(loopTotals.sum())
+    loopPolygons = np.empty(len(loopOrder), dtype=np.int64)
+    loopPolygons[loopOrder] = np.repeat(np.arange(polyCount), loopTotals)
+    return loopTotals, loopOrder, loopPolygons
+
+
+def apply_auto_texture_vectorized(shape, eval):
+    # same projection as auto_texture_bmesh, computed for all loops at once
+    mesh = eval.data
+    polyCount = len(mesh.polygons)
+    loopCount = len(mesh.loops)
+
+    normals = np.empty(polyCount * 3, dtype=np.float32)
+    mesh.polygons.foreach_get('normal', normals)
+    normals = normals.reshape(-1, 3)
+    loopVerts = np.empty(loopCount, dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVerts)
+    coords = get_mesh_coords(mesh).astype(np.float64)
+    loopTotals, loopOrder, loopPolygons = get_polygon_loops(mesh)
+
+    # dominant normal axis, ties go to x then y
+    faceAxis = np.abs(normals).argmax(axis=1)
+    faceNegative = normals[np.arange(polyCount), faceAxis] < 0
+
+    # 0 wall, 1 floor, 2 ceiling
+    faceGroup = np.where(faceAxis == 2, np.where(faceNegative, 2, 1), 0)
+    groupRotation = np.radians([
+        shape.rmtc_wall_texture_rotation,
+        shape.rmtc_floor_texture_rotation,
+        shape.rmtc_ceiling_texture_rotation])
+    groupScaleOffset = np.array([
+        shape.rmtc_wall_texture_scale_offset,
+        shape.rmtc_floor_texture_scale_offset,
+        shape.rmtc_ceiling_texture_scale_offset], dtype=np.float64)
+
+    # project: x faces use yz, y faces use xz, z faces use xy
+    axis = faceAxis[loopPolygons]
+    uAxis = np.where(axis == 0, 1, 0)
+    vAxis = np.where(axis == 2, 1, 2)
+    objectScale = np.array(shape.scale, dtype=np.float64)
+    objectLocation = np.array(shape.location, dtype=np.float64)
+    loopCoords = coords[loopVerts]
+    loopRange = np.arange(loopCount)
+    u = loopCoords[loopRange, uAxis] * \
+        objectScale[uAxis] + objectLocation[uAxis]
+    v = loopCoords[loopRange, vAxis] * \
+        objectScale[vAxis] + objectLocation[vAxis]
+
+    # rotate + scale + offset
+    group = faceGroup[loopPolygons]
+    cos = np.cos(groupRotation)[group]
+    sin = np.sin(groupRotation)[group]
+    scaleOffset = groupScaleOffset[group]
+    uvs = np.empty((loopCount, 2), dtype=np.float32)
+    uvs[:, 0] = (u * cos - v * sin) * scaleOffset[:, 0] + scaleOffset[:, 2]
+    uvs[:, 1] = (u * sin + v * cos) * scaleOffset[:, 1] + scaleOffset[:, 3]
+
+    uvLayer = mesh.uv_layers.active
+    if uvLayer is None:
+        uvLayer = mesh.uv_layers.new()
+    uvLayer.data.foreach_set('uv', uvs.ravel())
+
+
+def post_process_room(shape, room, flip, autoTexture, vectorizedTexture):
+    # remove material + flip + triangulate + auto texture in one mesh round-trip
+    mesh = room.data
+    removeIndices = get_remove_material_indices(room)
+
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+
+    if len(removeIndices) > 0:
+        bmesh.ops.delete(bm, geom=[
+            f for f in bm.faces if f.material_index in removeIndices], context='FACES')
+
+    if flip:
+        bmesh.ops.reverse_faces(bm, faces=bm.faces[:])
+
+    bmesh.ops.triangulate(bm, faces=bm.faces[:],
+                          quad_method='SHORT_EDGE', ngon_method='BEAUTY')
+
+    if autoTexture and not vectorizedTexture:
+        bm.normal_update()
+        auto_texture_bmesh(shape, bm)
+
     bm.to_mesh(mesh)
     bm.free()
 
-    eval.data = mesh
+    # pop from the back so the other indices stay valid
+    for i in reversed(removeIndices):
+        mesh.materials.pop(index=i)
+
+    # the vectorized kernel reads the written mesh directly
+    if autoTexture and vectorizedTexture:
+        apply_auto_texture_vectorized(shape, room)
+
+
+def merge_labels(count, a, b):
+    # connected components of index pairs, every index labeled with the lowest index of its component
+    labels = np.arange(count)
+    while True:
+        lower = np.minimum(labels[a], labels[b])
+        merged = labels.copy()
+        np.minimum.at(merged, labels[a], lower)
+        np.minimum.at(merged, labels[b], lower)
+        merged = merged[merged]
+        if (merged == labels).all():
+            return labels
+        labels = merged
+
+
+def get_close_pairs(co, tolerance):
+    # point pairs closer than the tolerance, every pair of points in the same or
+    # neighbouring tolerance sized grid cells gets a real distance check
+    co = np.asarray(co, dtype=np.float64)
+    cells = np.floor(co / tolerance).astype(np.int64)
+    cellKeys, cellIds, cellCounts = np.unique(
+        cells, axis=0, return_inverse=True, return_counts=True)
+    pointOrder = np.argsort(cellIds.reshape(-1), kind='stable')
+    cellStarts = np.cumsum(cellCounts) - cellCounts
+
+    cellIndex = {key: i for i, key in enumerate(map(tuple, cellKeys.tolist()))}
+    offsets = [(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1)
+               for z in (-1, 0, 1) if (x, y, z) >= (0, 0, 0)]
+    pairsA = []
+    pairsB = []
+    for x, y, z in offsets:
+        neighbours = np.array([cellIndex.get((i + x, j + y, k + z), -1)
+                               for i, j, k in cellKeys.tolist()], dtype=np.int64).reshape(-1)
+        cellsA = np.flatnonzero(neighbours >= 0)
+        cellsB = neighbours[cellsA]
+
+        # every point of cell a against every point of cell b
+        countsA = cellCounts[cellsA]
+        countsB = cellCounts[cellsB]
+        pairCounts = countsA * countsB
+        pairCells = np.repeat(np.arange(len(cellsA)), pairCounts)
+        local = np.arange(pairCounts.sum()) - \
+            np.repeat(np.cumsum(pairCounts) - pairCounts, pairCounts)
+        pointsA = pointOrder[cellStarts[cellsA][pairCells] + local // countsB[pairCells]]
+        pointsB = pointOrder[cellStarts[cellsB][pairCells] + local % countsB[pairCells]]
+        if (x, y, z) == (0, 0, 0):
+            distinct = pointsA < pointsB
+            pointsA = pointsA[distinct]
+            pointsB = pointsB[distinct]
+
+        close = np.linalg.norm(co[pointsA] - co[pointsB], axis=1) < tolerance
+        pairsA.append(pointsA[close])
+        pairsB.append(pointsB[close])
+    return np.concatenate(pairsA), np.concatenate(pairsB)
+
+
+def weld_mesh_arrays(arrays, tolerance):
+    # merge vertices closer than the tolerance (edges shorter than it collapse with them),
+    # snap near equal uvs of a vertex (per material, real seams stay split), then drop the
+    # faces that collapsed, duplicate triangles and the vertices left unused.
+    # faces that still span an area stay, so a closed room stays closed
+    # returns the new arrays and before/after counts
+    loopTotals = arrays['loop_totals']
+    co = arrays['co']
+    loopVerts = arrays['loop_verts']
+    loopPolygons = np.repeat(np.arange(len(loopTotals)), loopTotals)
+    loopStarts = np.cumsum(loopTotals) - loopTotals
+    following = np.arange(1, len(loopVerts) + 1)
+    following[loopStarts + loopTotals - 1] = loopStarts
+
+    pairsA, pairsB = get_close_pairs(co, tolerance)
+    loopVerts = merge_labels(len(co), pairsA, pairsB)[loopVerts]
+
+    uvs = None
+    if 'uv' in arrays:
+        uvKeys = np.column_stack((loopVerts, arrays['material_indices'][loopPolygons],
+                                  np.round(arrays['uv'] / tolerance).astype(np.int64)))
+        _, firstLoops, uvIds = np.unique(
+            uvKeys, axis=0, return_index=True, return_inverse=True)
+        uvs = arrays['uv'][firstLoops][uvIds.reshape(-1)]
+
+    # corners repeating the next corner of their polygon go away, faces left with
+    # less than 3 corners collapsed
+    keptLoops = np.flatnonzero(loopVerts != loopVerts[following])
+    loopVerts = loopVerts[keptLoops]
+    loopPolygons = loopPolygons[keptLoops]
+    totals = np.bincount(loopPolygons, minlength=len(loopTotals))
+    starts = np.cumsum(totals) - totals
+    keepPolygons = totals >= 3
+
+    # same triangle twice, any starting corner, same winding
+    tris = np.flatnonzero(keepPolygons & (totals == 3))
+    triVerts = loopVerts[starts[tris, None] + np.arange(3)]
+    shift = triVerts.argmin(axis=1)
+    triVerts = np.take_along_axis(
+        triVerts, (shift[:, None] + np.arange(3)) % 3, axis=1)
+    _, firstTris = np.unique(triVerts, axis=0, return_index=True)
+    duplicate = np.ones(len(tris), dtype=bool)
+    duplicate[firstTris] = False
+    keepPolygons[tris[duplicate]] = False
+
+    keep = keepPolygons[loopPolygons]
+    usedVerts, loopVerts = np.unique(loopVerts[keep], return_inverse=True)
+    welded = dict(arrays)
+    welded['co'] = co[usedVerts]
+    welded['loop_totals'] = totals[keepPolygons].astype(np.int32)
+    welded['loop_verts'] = loopVerts.reshape(-1).astype(np.int32)
+    welded['material_indices'] = arrays['material_indices'][keepPolygons]
+    welded['smooth'] = arrays['smooth'][keepPolygons]
+    if uvs is not None:
+        welded['uv'] = uvs[keptLoops[keep]]
+
+    counts = {
+        'verts_before': len(arrays['co']),
+        'verts_after': len(welded['co']),
+        'tris_before': int((loopTotals - 2).sum()),
+        'tris_after': int((welded['loop_totals'] - 2).sum()),
+    }
+    return welded, counts
+
+
+def apply_weld(room, tolerance):
+    # weld + cleanup of a built room in one mesh round-trip
+    arrays, counts = weld_mesh_arrays(mesh_to_arrays(room.data), tolerance)
+    mesh_from_arrays(room.data, arrays)
+    return counts
+
+
+def get_acmr(tris, cacheSize):
+    # average cache miss ratio of an index buffer on a fifo post-transform cache
+    if len(tris) == 0:
+        return 0.0
+    insertTime = {}
+    misses = 0
+    for v in tris.ravel().tolist():
+        if misses - insertTime.get(v, -cacheSize - 1) > cacheSize:
+            insertTime[v] = misses
+            misses += 1
+    return misses / len(tris)
+
+
+def tipsify(tris, vertexCount, cacheSize):
+    # triangle order of sander et al. 2007: fan around a vertex that is still in the
+    # cache and has the fewest live triangles left, returns the triangle order
+    flat = tris.ravel()
+    useCounts = np.bincount(flat, minlength=vertexCount)
+    adjacencyStarts = (np.cumsum(useCounts) - useCounts).tolist()
+    adjacencyEnds = np.cumsum(useCounts).tolist()
+    adjacency = (np.argsort(flat, kind='stable') // 3).tolist()
+    live = useCounts.tolist()
+    triVerts = tris.tolist()
+    cacheTime = [0] * vertexCount
+    emitted = [False] * len(triVerts)
+    order = []
+    deadEnds = []
+    clock = cacheSize + 1
+    cursor = 0
+    fan = 0 if vertexCount > 0 else -1
+    while fan >= 0:
+        candidates = []
+        for t in adjacency[adjacencyStarts[fan]:adjacencyEnds[fan]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            order.append(t)
+            for v in triVerts[t]:
+                deadEnds.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if clock - cacheTime[v] > cacheSize:
+                    cacheTime[v] = clock
+                    clock += 1
+
+        # next fan: the candidate staying longest in the cache without being flushed by its own fan
+        fan = -1
+        bestPriority = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if clock - cacheTime[v] + 2 * live[v] <= cacheSize:
+                    priority = clock - cacheTime[v]
+                if priority > bestPriority:
+                    bestPriority = priority
+                    fan = v
+        # dead end: recently used vertices first, then the next vertex in index order
+        while fan < 0 and len(deadEnds) > 0:
+            v = deadEnds.pop()
+            if live[v] > 0:
+                fan = v
+        while fan < 0 and cursor < vertexCount:
+            if live[cursor] > 0:
+                fan = cursor
+            cursor += 1
+    return np.array(order, dtype=np.int64)
+
+
+def optimize_vertex_cache(arrays, cacheSize):
+    # triangles in tipsify order, vertices in first use order, returns the new arrays and
+    # the acmr before/after, None when the mesh is not all triangles
+    loopTotals = arrays['loop_totals']
+    if len(loopTotals) == 0 or (loopTotals != 3).any():
+        return arrays, None
+    vertexCount = len(arrays['co'])
+    tris = arrays['loop_verts'].reshape(-1, 3)
+    acmrBefore = get_acmr(tris, cacheSize)
+    triOrder = tipsify(tris, vertexCount, cacheSize)
+    tris = tris[triOrder]
+
+    flat = tris.ravel()
+    firstUse = np.full(vertexCount, len(flat))
+    np.minimum.at(firstUse, flat, np.arange(len(flat)))
+    vertOrder = np.argsort(firstUse, kind='stable')
+    remap = np.empty(vertexCount, dtype=np.int32)
+    remap[vertOrder] = np.arange(vertexCount)
+
+    optimized = dict(arrays)
+    optimized['co'] = arrays['co'][vertOrder]
+    optimized['loop_verts'] = remap[flat]
+    optimized['material_indices'] = arrays['material_indices'][triOrder]
+    optimized['smooth'] = arrays['smooth'][triOrder]
+    if 'uv' in arrays:
+        optimized['uv'] = arrays['uv'].reshape(-1, 3, 2)[triOrder].reshape(-1, 2)
+    return optimized, {'acmr_before': acmrBefore, 'acmr_after': get_acmr(tris, cacheSize)}
+
+
+def apply_vertex_cache(room, cacheSize):
+    # index + vertex reorder of a triangulated room in one mesh round-trip
+    arrays, acmr = optimize_vertex_cache(mesh_to_arrays(room.data), cacheSize)
+    if acmr is not None:
+        mesh_from_arrays(room.data, arrays)
+    return acmr
+
+
+def get_sector_boolean(scene, sectorShapes, shapeBooleans, sectorBooleans):
+    # union of the sectors around a brush, shared by brushes touching the same sectors
+    key = frozenset(sectorShapes)
+    if key not in sectorBooleans:
+        booleans = [get_shape_boolean(shape, shapeBooleans)
+                    for shape in sectorShapes]
+        if len(booleans) == 1:
+            sectorBooleans[key] = booleans[0]
+        else:
+            sectorBoolean = create_mesh_obj('sectorBoolean')
+            link_collection_unique(sectorBoolean, scene.collection)
+            if scene.rmtc_multi_operand:
+                apply_csg_multi(sectorBoolean, booleans, 'UNION')
+            else:
+                for boolean in booleans:
+                    apply_csg(sectorBoolean, boolean, 'UNION')
+            sectorBooleans[key] = sectorBoolean
+    return sectorBooleans[key]
+
+
+def unlink_sector_booleans(sectorBooleans):
+    for sectorBoolean in sectorBooleans.values():
+        unlink_collections_all(sectorBoolean)
+
+
+def get_mesh_polygon_list(mesh):
+    # vertex index array per polygon + the loop indices in polygon order
+    loopTotals, loopOrder, loopPolygons = get_polygon_loops(mesh)
+    loopVerts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVerts)
+    loopVerts = loopVerts[loopOrder]
+    return np.split(loopVerts, np.cumsum(loopTotals)[:-1]), loopOrder
+
+
+def polygon_normal(points):
+    # newell normal, robust for any planar polygon
+    following = np.roll(points, -1, axis=0)
+    normal = np.array([
+        ((points[:, 1] - following[:, 1]) * (points[:, 2] + following[:, 2])).sum(),
+        ((points[:, 2] - following[:, 2]) * (points[:, 0] + following[:, 0])).sum(),
+        ((points[:, 0] - following[:, 0]) * (points[:, 1] + following[:, 1])).sum()])
+    length = np.linalg.norm(normal)
+    return normal / length if length > 0 else normal
+
+
+def is_convex_polyhedron(coords, polygons, edgeUses, eps):
+    # closed (every edge used twice) and every vertex behind every face plane
+    if len(polygons) < 4 or (edgeUses != 2).any():
+        return False
+    for verts in polygons:
+        points = coords[verts]
+        normal = polygon_normal(points)
+        if not normal.any():
+            return False
+        if ((coords - points[0]) @ normal > eps).any():
+            return False
+    return True
+
+
+def is_convex_mesh(mesh, eps):
+    polygons, loopOrder = get_mesh_polygon_list(mesh)
+    return is_convex_polyhedron(get_mesh_coords(mesh).astype(np.float64), polygons, get_edge_uses(mesh), eps)
+
+
+def get_convex_planes(coords, polygons):
+    # (n, 4) unique outward planes: normal xyz + distance
+    planes = []
+    for verts in polygons:
+        points = coords[verts]
+        normal = polygon_normal(points)
+        planes.append((normal[0], normal[1], normal[2],
+                      normal @ points.mean(axis=0)))
+    return np.unique(np.round(np.array(planes), 6), axis=0)
+
+
+def split_polygon(points, dist, eps):
+    # sutherland-hodgman split by a plane, returns the front and back pieces
+    # points carry extra columns (uvs) which get interpolated along
+    front = []
+    back = []
+    count = len(points)
+    for i in range(count):
+        j = (i + 1) % count
+        if dist[i] >= -eps:
+            front.append(points[i])
+        if dist[i] <= eps:
+            back.append(points[i])
+        if (dist[i] > eps and dist[j] < -eps) or (dist[i] < -eps and dist[j] > eps):
+            t = dist[i] / (dist[i] - dist[j])
+            point = points[i] + (points[j] - points[i]) * t
+            front.append(point)
+            back.append(point)
+    return front, back
+
+
+def carve_polygon(points, normal, planes, eps):
+    # pieces of a polygon outside a convex volume
+    # on a plane of the volume, a polygon facing the same way counts as outside
+    pieces = []
+    remaining = points
+    for plane in planes:
+        dist = remaining[:, 0:3] @ plane[0:3] - plane[3]
+        if (np.abs(dist) <= eps).all():
+            if normal @ plane[0:3] > 0:
+                pieces.append(remaining)
+                return pieces
+            continue
+        if (dist >= -eps).all():
+            pieces.append(remaining)
+            return pieces
+        if (dist <= eps).all():
+            continue
+        front, back = split_polygon(remaining, dist, eps)
+        if len(front) >= 3:
+            pieces.append(np.array(front))
+        if len(back) < 3:
+            return pieces
+        remaining = np.array(back)
+    return pieces
+
+
+def fix_t_junctions(coords, polygons, corners, eps):
+    # insert the vertices lying inside a polygon edge into that edge, so pieces stay watertight
+    for p, verts in enumerate(polygons):
+        newVerts = []
+        newCorners = []
+        count = len(verts)
+        for i in range(count):
+            a = verts[i]
+            b = verts[(i + 1) % count]
+            newVerts.append(a)
+            newCorners.append(corners[p][i])
+
+            edge = coords[b] - coords[a]
+            lengthSquared = edge @ edge
+            if lengthSquared == 0:
+                continue
+            t = ((coords - coords[a]) @ edge) / lengthSquared
+            dist = np.linalg.norm(
+                coords - (coords[a] + t[:, None] * edge), axis=1)
+            onEdge = np.flatnonzero((t > 0) & (t < 1) & (dist <= eps))
+            onEdge = onEdge[(onEdge != a) & (onEdge != b)]
+            for v in onEdge[np.argsort(t[onEdge])].tolist():
+                newVerts.append(v)
+                newCorners.append(
+                    corners[p][i] + (corners[p][(i + 1) % count] - corners[p][i]) * t[v])
+        polygons[p] = newVerts
+        corners[p] = newCorners
+
+
+def convex_carve(coords, polygons, corners, neighbourPlanes, eps):
+    # room surface outside every convex neighbour, what union + remove material leaves
+    # coords: world space room vertices, corners: per polygon corner attributes (uvs)
+    # returns vertex coords, polygons as vertex lists, source polygon and corners of each
+    outCoords = []
+    outPolygons = []
+    outSources = []
+    outCorners = []
+    vertexMap = {}
+    for p, verts in enumerate(polygons):
+        points = np.hstack((coords[verts], corners[p]))
+        normal = polygon_normal(coords[verts])
+        pieces = [points]
+        for planes in neighbourPlanes:
+            carved = []
+            for piece in pieces:
+                carved.extend(carve_polygon(piece, normal, planes, eps))
+            pieces = carved
+
+        for piece in pieces:
+            pieceVerts = []
+            for point in piece:
+                key = tuple(np.round(point[0:3], 6).tolist())
+                if key not in vertexMap:
+                    vertexMap[key] = len(outCoords)
+                    outCoords.append(point[0:3])
+                pieceVerts.append(vertexMap[key])
+            # drop corners merged by the weld
+            keep = [i for i in range(len(pieceVerts))
+                    if pieceVerts[i] != pieceVerts[i - 1]]
+            if len(keep) < 3:
+                continue
+            outPolygons.append([pieceVerts[i] for i in keep])
+            outCorners.append([piece[i, 3:] for i in keep])
+            outSources.append(p)
+
+    outCoords = np.array(outCoords, dtype=np.float64).reshape(-1, 3)
+    fix_t_junctions(outCoords, outPolygons, outCorners, eps)
+    return outCoords, outPolygons, outSources, outCorners
+
+
+def get_convex_eps(scene):
+    # plane tolerance of the convex tests, below the precision grid but above float32 noise
+    return max(0.25 * 10 ** -scene.rmtc_precision, 1e-5)
+
+
+def is_shape_convex(shape, shapeBooleans, convexShapes, eps):
+    # closed convex shapes without mirroring can skip the boolean solver
+    if shape not in convexShapes:
+        convexShapes[shape] = bool(np.linalg.det(np.array(shape.matrix_world)[0:3, 0:3]) > 0) and is_convex_mesh(
+            get_shape_boolean(shape, shapeBooleans).data, eps)
+    return convexShapes[shape]
+
+
+def apply_convex_csg(room, shape0, neighbours, shapeBooleans, eps):
+    # union with convex neighbours by clipping the room faces against their planes
+    # clipping happens in world space, the result goes back into the room mesh
+    mesh = room.data
+    arrays = mesh_to_arrays(mesh)
+    mat = np.array(shape0.matrix_world, dtype=np.float64)
+
+    loopStarts = np.cumsum(arrays['loop_totals']) - arrays['loop_totals']
+    polygons = np.split(arrays['loop_verts'], loopStarts[1:])
+    uvs = arrays.get('uv', np.zeros((len(arrays['loop_verts']), 0)))
+    corners = np.split(uvs.astype(np.float64), loopStarts[1:])
+
+    neighbourPlanes = []
+    for shape1 in neighbours:
+        booleanMesh = get_shape_boolean(shape1, shapeBooleans).data
+        polygons1, loopOrder1 = get_mesh_polygon_list(booleanMesh)
+        neighbourPlanes.append(get_convex_planes(transform_coords(
+            shape1.matrix_world, get_mesh_coords(booleanMesh)), polygons1))
+
+    outCoords, outPolygons, outSources, outCorners = convex_carve(
+        transform_coords(mat, arrays['co']), polygons, corners, neighbourPlanes, eps)
+
+    outSources = np.array(outSources, dtype=np.int64)
+    arrays['co'] = transform_coords(
+        np.linalg.inv(mat), outCoords).astype(np.float32)
+    arrays['loop_totals'] = np.array(
+        [len(verts) for verts in outPolygons], dtype=np.int32)
+    arrays['loop_verts'] = np.array(
+        [v for verts in outPolygons for v in verts], dtype=np.int32)
+    arrays['material_indices'] = arrays['material_indices'][outSources]
+    arrays['smooth'] = arrays['smooth'][outSources]
+    if 'uv' in arrays:
+        arrays['uv'] = np.array(
+            [c for polygonCorners in outCorners for c in polygonCorners], dtype=np.float32).reshape(-1, 2)
+    mesh_from_arrays(mesh, arrays)
+
+
+def get_shape_collision(shape, shapeBooleans, shapeCollisions):
+    # world space vertices, fan triangles, polygon normals and edges of a shape boolean
+    if shape not in shapeCollisions:
+        mesh = get_shape_boolean(shape, shapeBooleans).data
+        coords = transform_coords(shape.matrix_world, get_mesh_coords(mesh))
+        polygons, loopOrder = get_mesh_polygon_list(mesh)
+        tris = np.array([(verts[0], verts[i], verts[i + 1]) for verts in polygons
+                         for i in range(1, len(verts) - 1)], dtype=np.int64).reshape(-1, 3)
+        normals = np.array([polygon_normal(coords[verts])
+                           for verts in polygons]).reshape(-1, 3)
+        edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+        mesh.edges.foreach_get('vertices', edges)
+        shapeCollisions[shape] = (coords, tris, normals, edges.reshape(-1, 2))
+    return shapeCollisions[shape]
+
+
+def is_separated(coordsA, coordsB, axes, tolerance):
+    # true when the projections on one of the axes are further apart than tolerance
+    lengths = np.linalg.norm(axes, axis=1)
+    valid = lengths > 1e-9
+    axes = axes[valid] / lengths[valid, None]
+    projA = coordsA @ axes.T
+    projB = coordsB @ axes.T
+    return bool(((projA.min(axis=0) - projB.max(axis=0) > tolerance) |
+                 (projB.min(axis=0) - projA.max(axis=0) > tolerance)).any())
+
+
+def triangles_touch(coordsA, trisA, coordsB, trisB, tolerance, chunk=256):
+    # any triangle pair closer than tolerance: aabb prefilter, then sat on the candidates
+    # axes are both normals, the 9 edge crosses and the in-plane edge normals for coplanar pairs
+    triCoordsA = coordsA[trisA]
+    triCoordsB = coordsB[trisB]
+    minB = triCoordsB.min(axis=1)
+    maxB = triCoordsB.max(axis=1)
+    for start in range(0, len(triCoordsA), chunk):
+        a = triCoordsA[start:start + chunk]
+        i, j = np.nonzero(((a.min(axis=1)[:, None] - tolerance <= maxB[None]) &
+                           (a.max(axis=1)[:, None] + tolerance >= minB[None])).all(axis=2))
+        if len(i) == 0:
+            continue
+
+        ta = a[i]
+        tb = triCoordsB[j]
+        edgesA = np.roll(ta, -1, axis=1) - ta
+        edgesB = np.roll(tb, -1, axis=1) - tb
+        normalA = np.cross(edgesA[:, 0], edgesA[:, 1])
+        normalB = np.cross(edgesB[:, 0], edgesB[:, 1])
+        axes = np.concatenate((
+            normalA[:, None],
+            normalB[:, None],
+            np.cross(edgesA[:, :, None], edgesB[:, None, :]).reshape(-1, 9, 3),
+            np.cross(normalA[:, None], edgesA),
+            np.cross(normalB[:, None], edgesB)), axis=1)
+
+        lengths = np.linalg.norm(axes, axis=2)
+        valid = lengths > 1e-12
+        axes = axes / np.where(valid, lengths, 1)[:, :, None]
+        projA = np.einsum('kvd,kad->kva', ta, axes)
+        projB = np.einsum('kvd,kad->kva', tb, axes)
+        gap = np.maximum(projA.min(axis=1) - projB.max(axis=1),
+                         projB.min(axis=1) - projA.max(axis=1))
+        if not ((gap > tolerance) & valid).any(axis=1).all():
+            return True
+    return False
+
+
+def shapes_touch(collisionA, convexA, collisionB, convexB, tolerance):
+    coordsA, trisA, normalsA, edgesA = collisionA
+    coordsB, trisB, normalsB, edgesB = collisionB
+
+    # a separating face normal separates the hulls, so it holds for any shape
+    # with two convex shapes the edge crosses make it exact
+    axes = np.vstack((normalsA, normalsB))
+    if convexA and convexB:
+        directionsA = coordsA[edgesA[:, 1]] - coordsA[edgesA[:, 0]]
+        directionsB = coordsB[edgesB[:, 1]] - coordsB[edgesB[:, 0]]
+        axes = np.vstack((axes, np.cross(
+            directionsA[:, None], directionsB[None]).reshape(-1, 3)))
+    if is_separated(coordsA, coordsB, axes, tolerance):
+        return False
+    if convexA and convexB:
+        return True
+
+    if triangles_touch(coordsA, trisA, coordsB, trisB, tolerance):
+        return True
+
+    # no surface contact, they only touch when one is inside the other
+    minA, maxA = coordsA.min(axis=0), coordsA.max(axis=0)
+    minB, maxB = coordsB.min(axis=0), coordsB.max(axis=0)
+    return bool(((minA <= minB) & (maxA >= maxB)).all() or ((minB <= minA) & (maxB >= maxA)).all())
+
+
+def narrow_intersection_map(shapeIntersections, checkShapes, shapeBooleans, convexShapes, eps, tolerance):
+    # drops the broad-phase pairs that don't touch, returns how many
+    # pairs of two unchanged shapes keep the result stored by the last build
+    shapeCollisions = {}
+    storedNeighbours = {}
+    culled = 0
+    for shape0, neighbours in shapeIntersections.items():
+        for shape1 in list(neighbours):
+            if shape1.name <= shape0.name:
+                continue
+            if shape0 in checkShapes or shape1 in checkShapes:
+                touching = shapes_touch(
+                    get_shape_collision(shape0, shapeBooleans, shapeCollisions),
+                    is_shape_convex(shape0, shapeBooleans, convexShapes, eps),
+                    get_shape_collision(shape1, shapeBooleans, shapeCollisions),
+                    is_shape_convex(shape1, shapeBooleans, convexShapes, eps),
+                    tolerance)
+            else:
+                if shape0 not in storedNeighbours:
+                    storedNeighbours[shape0] = set(get_shape_neighbours(shape0))
+                touching = shape1.name in storedNeighbours[shape0]
+            if not touching:
+                neighbours.discard(shape1)
+                shapeIntersections[shape1].discard(shape0)
+                culled += 1
+    return culled
+
+
+def get_boundary_loops(mesh):
+    # closed chains of edges used by a single face, in face winding order
+    loopTotals, loopOrder, loopPolygons = get_polygon_loops(mesh)
+    loopVerts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVerts)
+    loopEdges = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('edge_index', loopEdges)
+    loopVerts = loopVerts[loopOrder]
+    loopEdges = loopEdges[loopOrder]
+
+    loopStarts = np.cumsum(loopTotals) - loopTotals
+    following = np.arange(1, len(loopVerts) + 1)
+    following[loopStarts + loopTotals - 1] = loopStarts
+    boundary = get_edge_uses(mesh)[loopEdges] == 1
+
+    outgoing = {}
+    for a, b in zip(loopVerts[boundary].tolist(), loopVerts[following][boundary].tolist()):
+        outgoing.setdefault(a, []).append(b)
+
+    loops = []
+    for a in list(outgoing):
+        while len(outgoing[a]) > 0:
+            loop = [a]
+            v = outgoing[a].pop()
+            while v != a and len(outgoing.get(v, [])) > 0:
+                loop.append(v)
+                v = outgoing[v].pop()
+            if v == a and len(loop) >= 3:
+                loops.append(loop)
+    return loops
+
+
+def get_winding_number(point, coords, tris):
+    # generalized winding number, ~1 inside a closed outward mesh, ~0 outside
+    # exact for any triangulation, fan triangles of concave polygons included
+    a = coords[tris[:, 0]] - point
+    b = coords[tris[:, 1]] - point
+    c = coords[tris[:, 2]] - point
+    lengthA = np.linalg.norm(a, axis=1)
+    lengthB = np.linalg.norm(b, axis=1)
+    lengthC = np.linalg.norm(c, axis=1)
+    det = (a * np.cross(b, c)).sum(axis=1)
+    div = lengthA * lengthB * lengthC + (a * b).sum(axis=1) * lengthC + \
+        (b * c).sum(axis=1) * lengthA + (c * a).sum(axis=1) * lengthB
+    return float(np.arctan2(det, div).sum() / (2 * math.pi))
+
+
+def extract_room_portals(shape0, room, neighbours, shapeBooleans, shapeCollisions, tolerance):
+    # openings of a room and the neighbour each one leads into
+    # plane normals point from the room into the neighbour
+    mesh = room.data
+    coords = transform_coords(shape0.matrix_world, get_mesh_coords(mesh))
+    ownCollision = get_shape_collision(shape0, shapeBooleans, shapeCollisions)
+    offset = tolerance * 10
+
+    portals = []
+    for loop in get_boundary_loops(mesh):
+        points = coords[loop]
+        normal = polygon_normal(points)
+        if not normal.any():
+            continue
+        centre = points.mean(axis=0)
+        if get_winding_number(centre + normal * offset, ownCollision[0], ownCollision[1]) > 0.5:
+            normal = -normal
+
+        for shape1 in neighbours:
+            collision = get_shape_collision(
+                shape1, shapeBooleans, shapeCollisions)
+            if max(get_winding_number(centre + normal * offset, collision[0], collision[1]),
+                   get_winding_number(centre - normal * offset, collision[0], collision[1])) > 0.5:
+                portals.append({
+                    'room': 'rmtc_' + shape1.name,
+                    'points': np.round(points, 6).tolist(),
+                    'plane': np.round(np.append(normal, normal @ centre), 6).tolist(),
+                })
+                break
+    return portals
+
+
+def get_room_portals(room):
+    # [{'room': target room name, 'points': [[x, y, z], ...], 'plane': [nx, ny, nz, d]}, ...]
+    if room is None or 'rmtc_portals' not in room:
+        return []
+    return json.loads(room['rmtc_portals'])
+
+
+def get_portal_graph(rooms):
+    # room name -> portals, the rooms a room leads into are the 'room' of its portals
+    return {room.name: get_room_portals(room) for room in rooms}
+
+
+def clip_winding(points, plane, eps):
+    # part of a portal in front of a plane, None when nothing of it is strictly in front
+    dist = points @ plane[:3] - plane[3]
+    if not (dist > eps).any():
+        return None
+    if (dist >= -eps).all():
+        return points
+    front = split_polygon(points, dist, eps)[0]
+    if len(front) < 3:
+        return None
+    return np.array(front)
+
+
+def get_separating_planes(source, target, eps):
+    # planes through an edge of one portal and a vertex of the other,
+    # with the source behind and the target in front
+    edgeStart = np.concatenate((
+        np.repeat(source, len(target), axis=0), np.repeat(target, len(source), axis=0)))
+    edges = np.concatenate((
+        np.repeat(np.roll(source, -1, axis=0) - source, len(target), axis=0),
+        np.repeat(np.roll(target, -1, axis=0) - target, len(source), axis=0)))
+    toVertex = np.concatenate((np.tile(target, (len(source), 1)),
+                               np.tile(source, (len(target), 1)))) - edgeStart
+    normals = np.empty_like(edges)
+    normals[:, 0] = edges[:, 1] * toVertex[:, 2] - edges[:, 2] * toVertex[:, 1]
+    normals[:, 1] = edges[:, 2] * toVertex[:, 0] - edges[:, 0] * toVertex[:, 2]
+    normals[:, 2] = edges[:, 0] * toVertex[:, 1] - edges[:, 1] * toVertex[:, 0]
+    lengths = np.sqrt((normals * normals).sum(axis=1))
+    valid = lengths > eps
+    normals = normals[valid] / lengths[valid, None]
+    planes = np.column_stack((normals, (normals * edgeStart[valid]).sum(axis=1)))
+
+    # orient with the source behind, keep planes that really separate the two
+    sourceDist = source @ planes[:, :3].T - planes[:, 3]
+    flip = (sourceDist > eps).any(axis=0)
+    planes[flip] = -planes[flip]
+    sourceDist[:, flip] = -sourceDist[:, flip]
+    targetDist = target @ planes[:, :3].T - planes[:, 3]
+    separating = (sourceDist <= eps).all(axis=0) & (sourceDist < -eps).any(axis=0) & \
+        (targetDist >= -eps).all(axis=0) & (targetDist > eps).any(axis=0)
+    return planes[separating]
+
+
+def get_pvs_portals(rooms):
+    # flat portal arrays of the level, portal i leads from portalFrom[i] into portalTo[i]
+    roomIds = {room.name: i for i, room in enumerate(rooms)}
+    portalFrom = []
+    portalTo = []
+    portalPoints = []
+    portalPlanes = []
+    roomPortals = [[] for room in rooms]
+    portalGraph = get_portal_graph(rooms)
+    for i, room in enumerate(rooms):
+        for portal in portalGraph[room.name]:
+            if portal['room'] not in roomIds:
+                continue
+            roomPortals[i].append(len(portalFrom))
+            portalFrom.append(i)
+            portalTo.append(roomIds[portal['room']])
+            portalPoints.append(np.array(portal['points'], dtype=np.float64))
+            portalPlanes.append(portal['plane'])
+    portalPlanes = np.array(portalPlanes, dtype=np.float64).reshape(-1, 4)
+    return portalFrom, portalTo, portalPoints, portalPlanes, roomPortals
+
+
+def get_portal_might_see(portals, roomCount, eps):
+    # coarse visibility from plane sides alone: portal q might be seen through portal p
+    # when q reaches in front of p and p reaches behind q, flooded into rooms per portal
+    portalFrom, portalTo, portalPoints, portalPlanes, roomPortals = portals
+    count = len(portalPoints)
+    mightRooms = np.zeros((count, roomCount), dtype=bool)
+    if count == 0:
+        return mightRooms
+
+    # pad every portal to the same point count by repeating its first point
+    maxPoints = max(len(points) for points in portalPoints)
+    padded = np.array([np.concatenate((points, np.repeat(points[:1], maxPoints - len(points), axis=0)))
+                       for points in portalPoints])
+    inFront = np.empty((count, count), dtype=bool)
+    behind = np.empty((count, count), dtype=bool)
+    chunk = max(1, 4000000 // (count * maxPoints))
+    for start in range(0, count, chunk):
+        planes = portalPlanes[start:start + chunk]
+        dist = np.einsum('qkc,pc->pqk', padded, planes[:, :3]) - planes[:, 3, None, None]
+        inFront[start:start + chunk] = dist.max(axis=2) > eps
+        behind[start:start + chunk] = dist.min(axis=2) < -eps
+    might = inFront & behind.T
+
+    for p in range(count):
+        mightRooms[p, portalTo[p]] = True
+        stack = [portalTo[p]]
+        while len(stack) > 0:
+            room = stack.pop()
+            for q in roomPortals[room]:
+                if might[p, q] and not mightRooms[p, portalTo[q]]:
+                    mightRooms[p, portalTo[q]] = True
+                    stack.append(portalTo[q])
+    return mightRooms
+
+
+def get_room_pvs(roomIndex, portals, mightRooms, roomCount, eps):
+    # portal flow from every portal of the room, each step clips the next portal
+    # to the anti-penumbra of the source and pass portals
+    portalFrom, portalTo, portalPoints, portalPlanes, roomPortals = portals
+    visible = np.zeros(roomCount, dtype=bool)
+    visible[roomIndex] = True
+    for p0 in roomPortals[roomIndex]:
+        visible[portalTo[p0]] = True
+        sourcePlane = portalPlanes[p0]
+        stack = [(portalPoints[p0], None, None, portalTo[p0], mightRooms[p0], {roomIndex, portalTo[p0]})]
+        while len(stack) > 0:
+            source, passPoints, passPlane, room, might, path = stack.pop()
+            separators = None
+            for q in roomPortals[room]:
+                to = portalTo[q]
+                if to in path or not might[to]:
+                    continue
+                # nothing new can be reached past this portal
+                nextMight = might & mightRooms[q]
+                if not (nextMight & ~visible).any():
+                    continue
+
+                target = clip_winding(portalPoints[q], sourcePlane, eps)
+                if target is not None and passPlane is not None:
+                    target = clip_winding(target, passPlane, eps)
+                nextSource = source
+                if target is not None and passPoints is not None:
+                    if separators is None:
+                        separators = get_separating_planes(source, passPoints, eps)
+                    for plane in separators:
+                        target = clip_winding(target, plane, eps)
+                        if target is None:
+                            break
+                    # only the part of the source that sees the target through the pass
+                    if target is not None:
+                        for plane in get_separating_planes(target, passPoints, eps):
+                            nextSource = clip_winding(nextSource, plane, eps)
+                            if nextSource is None:
+                                break
+                if target is None or nextSource is None:
+                    continue
 
+                visible[to] = True
+                stack.append((nextSource, target, portalPlanes[q], to, nextMight, path | {to}))
+    return visible
+
+
+def compute_level_pvs(rooms, eps, workerCount=1):
+    # room order, visible rooms of every room, per room timings and the portal count
+    # the flow is a python loop over small arrays, with more than one worker the rooms
+    # are flowed in background blender workers, rooms they didn't deliver are flowed here
+    rooms = sorted(rooms, key=lambda room: room.name)
+    portals = get_pvs_portals(rooms)
+    mightRooms = get_portal_might_see(portals, len(rooms), eps)
+    results = {}
+    if workerCount > 1 and len(rooms) > 1:
+        results = compute_pvs_parallel(portals, mightRooms, len(rooms), eps, workerCount)
+
+    pvs = {}
+    timings = []
+    for i, room in enumerate(rooms):
+        if i in results:
+            visible, seconds = results[i]
+        else:
+            start = time.perf_counter()
+            visible = get_room_pvs(i, portals, mightRooms, len(rooms), eps)
+            seconds = time.perf_counter() - start
+        pvs[room.name] = visible
+        timings.append({'name': room.name, 'seconds': seconds, 'visible': int(visible.sum())})
+    return [room.name for room in rooms], pvs, timings, len(portals[0])
+
+
+def save_pvs_portals(path, portals, mightRooms):
+    # portal arrays of the level as one npz, the points of all portals concatenated
+    portalFrom, portalTo, portalPoints, portalPlanes, roomPortals = portals
+    np.savez(path,
+             portal_from=np.array(portalFrom, dtype=np.int64),
+             portal_to=np.array(portalTo, dtype=np.int64),
+             point_counts=np.array([len(points) for points in portalPoints], dtype=np.int64),
+             points=np.concatenate(portalPoints) if len(portalPoints) > 0 else np.zeros((0, 3)),
+             planes=portalPlanes,
+             might_rooms=mightRooms)
+
+
+def load_pvs_portals(path):
+    # portals tuple + might see rooms back from save_pvs_portals
+    with np.load(path) as arrays:
+        arrays = dict(arrays)
+    portalFrom = arrays['portal_from'].tolist()
+    portalPoints = np.split(arrays['points'], np.cumsum(arrays['point_counts'])[:-1]) \
+        if len(portalFrom) > 0 else []
+    mightRooms = arrays['might_rooms']
+    roomPortals = [[] for i in range(mightRooms.shape[1])]
+    for p, room in enumerate(portalFrom):
+        roomPortals[room].append(p)
+    portals = (portalFrom, arrays['portal_to'].tolist(), portalPoints, arrays['planes'], roomPortals)
+    return portals, mightRooms
+
+
+def pack_room_pvs(visible):
+    # one bit per room of the level room order, stored as hex
+    return np.packbits(visible, bitorder='little').tobytes().hex()
+
+
+def get_room_pvs_names(room):
+    # names of the rooms visible from a room, None when the room has no pvs
+    # bit order is the rmtc_pvs_rooms list stored on the level collection
+    if room is None or 'rmtc_pvs' not in room:
+        return None
+    roomNames = None
+    for collection in room.users_collection:
+        if 'rmtc_pvs_rooms' in collection:
+            roomNames = json.loads(collection['rmtc_pvs_rooms'])
+    if roomNames is None:
+        return None
+    bits = np.unpackbits(np.frombuffer(bytes.fromhex(room['rmtc_pvs']), dtype=np.uint8),
+                         count=len(roomNames), bitorder='little')
+    return [name for name, bit in zip(roomNames, bits) if bit]
+
+
+def build_room(scene, shape0, neighbours, shapeBooleans, sectorBooleans, convexShapes, levelCollection):
+    # eval + csg + post-process for one room, returns the room and its build stats
+    roomStart = time.time()
+
+    # eval shape
+    evaluatedShape = eval_shape(shape0, 'rmtc_')
+    evaluatedShape.display_type = 'TEXTURED'
+    copy_materials(shape0, evaluatedShape)
+
+    # add remove_material
+    removeMaterialIndex = len(evaluatedShape.data.materials)
+    set_material_slots_size(evaluatedShape, len(
+        evaluatedShape.data.materials) + 1)
+    evaluatedShape.data.materials[removeMaterialIndex] = bpy.data.materials[scene.rmtc_remove_material]
+
+    # link
+    link_collection_unique(evaluatedShape, levelCollection)
+
+    vertsIn = len(evaluatedShape.data.vertices)
+    facesIn = len(evaluatedShape.data.polygons)
+
+    # csg operations as (booleans, operation)
+    # brushes are clipped once by the union of only the sectors they touch
+    # convex sectors with only convex neighbours are clipped directly, no solver
+    operations = []
+    convexEps = get_convex_eps(scene)
+    convex = (scene.rmtc_convex_csg and shape0.rmtc_shape_type != 'BRUSH' and len(neighbours) > 0 and
+              all(is_shape_convex(shape1, shapeBooleans, convexShapes, convexEps) for shape1 in [shape0] + neighbours))
+    if shape0.rmtc_shape_type == 'BRUSH':
+        brushBooleans = [get_shape_boolean(shape1, shapeBooleans)
+                         for shape1 in neighbours if shape1.rmtc_shape_type == 'BRUSH']
+        if len(brushBooleans) > 0:
+            if scene.rmtc_multi_operand:
+                operations.append((brushBooleans, 'UNION'))
+            else:
+                for boolean in brushBooleans:
+                    operations.append(([boolean], 'UNION'))
+        sectorShapes = [
+            shape1 for shape1 in neighbours if shape1.rmtc_shape_type != 'BRUSH']
+        if len(sectorShapes) > 0:
+            operations.append(([get_sector_boolean(
+                scene, sectorShapes, shapeBooleans, sectorBooleans)], 'INTERSECT'))
+    elif convex:
+        # faces are clipped against the neighbour planes below
+        pass
+    elif scene.rmtc_multi_operand:
+        if len(neighbours) > 0:
+            operations.append(([get_shape_boolean(
+                shape1, shapeBooleans) for shape1 in neighbours], 'UNION'))
+    else:
+        for shape1 in neighbours:
+            operations.append(
+                ([get_shape_boolean(shape1, shapeBooleans)], 'UNION'))
+
+    # apply csg
+    # adaptive: fast solver first, exact again when its result looks broken
+    # open shapes can not be validated, they always go exact
+    solverStart = time.time()
+    solver = 'EXACT'
+    if convex:
+        apply_convex_csg(evaluatedShape, shape0, neighbours,
+                         shapeBooleans, convexEps)
+        solver = 'CONVEX'
+    elif (scene.rmtc_solver_policy == 'FAST' or scene.rmtc_solver_policy == 'ADAPTIVE' and not shape0.rmtc_force_exact) and \
+            len(operations) > 0 and (get_edge_uses(evaluatedShape.data) == 2).all():
+        solver = 'FAST'
+
+    if solver == 'FAST':
+        inputMesh = evaluatedShape.data.copy()
+        if apply_csg_operations(evaluatedShape, operations, 'FAST', removeMaterialIndex) or scene.rmtc_solver_policy == 'FAST':
+            bpy.data.meshes.remove(inputMesh)
+        else:
+            fastMesh = evaluatedShape.data
+            meshName = fastMesh.name
+            evaluatedShape.data = inputMesh
+            bpy.data.meshes.remove(fastMesh)
+            inputMesh.name = meshName
+            apply_csg_operations(evaluatedShape, operations,
+                                 'EXACT', removeMaterialIndex)
+            shape0.rmtc_force_exact = True
+            solver = 'FALLBACK'
+    elif solver == 'EXACT':
+        apply_csg_operations(evaluatedShape, operations,
+                             'EXACT', removeMaterialIndex)
+    postStart = time.time()
+
+    post_process_room(
+        shape0, evaluatedShape,
+        flip=shape0.rmtc_shape_type != 'BRUSH',
+        autoTexture=shape0.rmtc_shape_type == 'SECTOR2D' or shape0.rmtc_shape_auto_texture,
+        vectorizedTexture=scene.rmtc_vectorized_texture)
+
+    weldCounts = None
+    if scene.rmtc_weld:
+        # half a precision step, vertices snapped one step apart stay apart
+        weldCounts = apply_weld(evaluatedShape, 0.5 * 10 ** -scene.rmtc_precision)
+
+    acmr = None
+    if scene.rmtc_vertex_cache:
+        acmr = apply_vertex_cache(evaluatedShape, scene.rmtc_vertex_cache_size)
+
+    roomEnd = time.time()
+    stats = {
+        'name': evaluatedShape.name,
+        'shape_type': shape0.rmtc_shape_type,
+        'neighbours': len(neighbours),
+        'booleans': len(operations),
+        'solver': solver,
+        'seconds': roomEnd - roomStart,
+        'solver_seconds': postStart - solverStart,
+        'post_seconds': roomEnd - postStart,
+        'verts_in': vertsIn,
+        'faces_in': facesIn,
+        'verts_out': len(evaluatedShape.data.vertices),
+        'faces_out': len(evaluatedShape.data.polygons),
+    }
+    if weldCounts is not None:
+        for key, value in weldCounts.items():
+            stats['weld_' + key] = value
+    if acmr is not None:
+        stats.update(acmr)
+    return evaluatedShape, stats
+
+
+def mesh_to_arrays(mesh):
+    # flat arrays of a mesh, loops in polygon order
+    loopTotals, loopOrder, loopPolygons = get_polygon_loops(mesh)
+    loopVerts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVerts)
+    materialIndices = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('material_index', materialIndices)
+    smooth = np.empty(len(mesh.polygons), dtype=bool)
+    mesh.polygons.foreach_get('use_smooth', smooth)
+
+    arrays = {
+        'co': get_mesh_coords(mesh),
+        'loop_totals': loopTotals,
+        'loop_verts': loopVerts[loopOrder],
+        'material_indices': materialIndices,
+        'smooth': smooth,
+        'auto_smooth': np.array([mesh.use_auto_smooth, mesh.auto_smooth_angle], dtype=np.float64),
+        'materials': np.array([m.name if m else '' for m in mesh.materials], dtype=str),
+    }
+
+    uvLayer = mesh.uv_layers.active
+    if uvLayer is not None:
+        uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+        uvLayer.data.foreach_get('uv', uvs)
+        arrays['uv'] = uvs.reshape(-1, 2)[loopOrder]
+
+    return arrays
+
+
+def mesh_from_arrays(mesh, arrays):
+    loopTotals = arrays['loop_totals']
+    mesh.clear_geometry()
+
+    mesh.vertices.add(len(arrays['co']))
+    mesh.vertices.foreach_set('co', arrays['co'].ravel())
+    mesh.loops.add(len(arrays['loop_verts']))
+    mesh.loops.foreach_set('vertex_index', arrays['loop_verts'])
+    mesh.polygons.add(len(loopTotals))
+    mesh.polygons.foreach_set('loop_start', (np.cumsum(
+        loopTotals) - loopTotals).astype(np.int32))
+    mesh.polygons.foreach_set('loop_total', loopTotals)
+    mesh.polygons.foreach_set('material_index', arrays['material_indices'])
+    mesh.polygons.foreach_set('use_smooth', arrays['smooth'])
+    mesh.update(calc_edges=True)
+
+    if 'uv' in arrays:
+        uvLayer = mesh.uv_layers.new()
+        uvLayer.data.foreach_set('uv', arrays['uv'].ravel())
+
+    mesh.use_auto_smooth = bool(arrays['auto_smooth'][0])
+    mesh.auto_smooth_angle = float(arrays['auto_smooth'][1])
+
+    mesh.materials.clear()
+    for name in arrays['materials'].tolist():
+        mesh.materials.append(bpy.data.materials.get(name) if name else None)
+
+
+def room_to_arrays(room):
+    arrays = mesh_to_arrays(room.data)
+    arrays['location'] = np.array(room.location, dtype=np.float32)
+    arrays['rotation'] = np.array(room.rotation_euler, dtype=np.float32)
+    arrays['scale'] = np.array(room.scale, dtype=np.float32)
+    return arrays
+
+
+def room_from_arrays(roomName, arrays):
+    mesh = bpy.data.meshes.new(roomName)
+    mesh_from_arrays(mesh, arrays)
 
-def apply_triangulate(shape):
-    bpy.ops.object.select_all(action='DESELECT')
-    bpy.context.view_layer.objects.active = shape
-    shape.select_set(True)
+    if roomName in bpy.data.objects:
+        room = bpy.data.objects[roomName]
+        room.data = mesh
+    else:
+        room = bpy.data.objects.new(roomName, mesh)
+
+    room.location = arrays['location'].tolist()
+    room.rotation_euler = arrays['rotation'].tolist()
+    room.scale = arrays['scale'].tolist()
+    room.display_type = 'TEXTURED'
+    return room
+
+
+# bump when the build output changes for the same inputs
+build_cache_version = 1
+
+
+def get_build_cache_dir(scene):
+    # roomantic_cache next to the .blend, none for unsaved files
+    if not scene.rmtc_build_cache or bpy.data.filepath == '':
+        return None
+    cacheDir = bpy.path.abspath('//roomantic_cache')
+    os.makedirs(cacheDir, exist_ok=True)
+    return cacheDir
+
+
+def room_cache_key(scene, shape, neighbours, shapeFingerprints):
+    # everything the room geometry depends on, names excluded so renames still hit
+    key = hashlib.blake2b(digest_size=20)
+    key.update(repr((
+        build_cache_version,
+        shapeFingerprints[shape],
+        [shapeFingerprints[neighbour] for neighbour in neighbours],
+        get_build_settings(scene),
+    )).encode())
+    return key.hexdigest()
+
+
+def load_cached_room(cacheDir, key, roomName):
+    path = os.path.join(cacheDir, key + '.npz')
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as arrays:
+            arrays = dict(arrays)
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        # truncated or corrupt entry, a miss that gets rebuilt and stored again
+        os.remove(path)
+        return None
+
+    # touch, eviction drops the least recently used rooms
+    os.utime(path)
+    return room_from_arrays(roomName, arrays)
+
+
+def store_cached_room(cacheDir, key, room):
+    # write then rename, so a cancelled build never leaves half a file
+    path = os.path.join(cacheDir, key + '.npz')
+    tempPath = os.path.join(cacheDir, key + '.tmp.npz')
+    np.savez(tempPath, **room_to_arrays(room))
+    os.replace(tempPath, path)
+
+
+def evict_build_cache(cacheDir, maxBytes):
+    entries = []
+    for entry in os.scandir(cacheDir):
+        # temp files of interrupted writes, old enough not to be another blender's write in progress
+        if entry.name.endswith('.tmp.npz'):
+            if time.time() - entry.stat().st_mtime > 3600:
+                os.remove(entry.path)
+            continue
+        if entry.name.endswith('.npz'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    totalBytes = sum(size for mtime, size, path in entries)
+    for mtime, size, path in sorted(entries):
+        if totalBytes <= maxBytes:
+            break
+        os.remove(path)
+        totalBytes -= size
+
+
+def start_worker(args, logPath):
+    # background blender running this file with the given arguments, output to a log
+    log = open(logPath, 'w')
+    process = subprocess.Popen([
+        bpy.app.binary_path, '--background', '--factory-startup',
+        '--python-exit-code', '1',
+        '--python', os.path.abspath(__file__),
+        '--'] + args,
+        stdout=log, stderr=subprocess.STDOUT)
+    return process, log
+
+
+def build_rooms_parallel(context, shapes, rooms, neighbourMap, levelCollection, workerCount, profiler):
+    # snapshot the shapes, build rooms in background blender workers and merge the meshes back
+    # returns the shapes whose room was built
+    scene = context.scene
+    builtShapes = set()
+    tempDir = tempfile.mkdtemp(prefix='roomantic_')
+    try:
+        snapshotPath = os.path.join(tempDir, 'snapshot.blend')
+        bpy.data.libraries.write(snapshotPath, set(
+            shapes) | {bpy.data.materials[scene.rmtc_remove_material]}, fake_user=True)
+
+        # balance by neighbour count, the booleans dominate
+        jobs = [[] for i in range(min(workerCount, len(rooms)))]
+        loads = [0] * len(jobs)
+        for shape in sorted(rooms, key=lambda s: len(neighbourMap[s]), reverse=True):
+            i = loads.index(min(loads))
+            jobs[i].append(shape)
+            loads[i] += 1 + len(neighbourMap[shape])
+
+        workers = []
+        for i, jobShapes in enumerate(jobs):
+            outputDir = os.path.join(tempDir, 'output_{}'.format(i))
+            os.mkdir(outputDir)
+            job = {
+                'snapshot': snapshotPath,
+                'output': outputDir,
+                'precision': scene.rmtc_precision,
+                'remove_material': scene.rmtc_remove_material,
+                'vectorized_texture': scene.rmtc_vectorized_texture,
+                'multi_operand': scene.rmtc_multi_operand,
+                'convex_csg': scene.rmtc_convex_csg,
+                'solver_policy': scene.rmtc_solver_policy,
+                'weld': scene.rmtc_weld,
+                'vertex_cache': scene.rmtc_vertex_cache,
+                'vertex_cache_size': scene.rmtc_vertex_cache_size,
+                'rooms': [{'shape': shape.name, 'neighbours': [n.name for n in neighbourMap[shape]]}
+                          for shape in jobShapes],
+            }
+            jobPath = os.path.join(tempDir, 'job_{}.json'.format(i))
+            with open(jobPath, 'w') as f:
+                json.dump(job, f)
+
+            process, log = start_worker(
+                ['--worker', jobPath], os.path.join(tempDir, 'worker_{}.log'.format(i)))
+            workers.append((process, log, jobShapes, outputDir))
+
+        # merge
+        for process, log, jobShapes, outputDir in workers:
+            process.wait()
+            log.close()
+            if process.returncode != 0:
+                with open(log.name) as f:
+                    print(f.read())
+                print("roomantic: worker failed, its rooms are built serially")
+                continue
+
+            for i, shape in enumerate(jobShapes):
+                roomPath = os.path.join(outputDir, 'room_{}.npz'.format(i))
+                if not os.path.exists(roomPath):
+                    continue
+                with np.load(roomPath) as arrays:
+                    arrays = dict(arrays)
+                room = room_from_arrays('rmtc_' + shape.name, arrays)
+                stats = json.loads(str(arrays['stats']))
+                if stats['solver'] == 'FALLBACK':
+                    shape.rmtc_force_exact = True
+                profiler.add_room(stats)
+                link_collection_unique(room, levelCollection)
+                builtShapes.add(shape)
+    finally:
+        shutil.rmtree(tempDir, ignore_errors=True)
+
+    print("roomantic: {} workers built {} of {} rooms".format(
+        len(jobs), len(builtShapes), len(rooms)))
+    return builtShapes
+
+
+def run_build_worker(jobPath):
+    # background worker: build the job rooms from the snapshot and save them as arrays
+    with open(jobPath) as f:
+        job = json.load(f)
+
+    # start from an empty file, so names match the snapshot
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for material in list(bpy.data.materials):
+        bpy.data.materials.remove(material)
+
+    with bpy.data.libraries.load(job['snapshot']) as (dataFrom, dataTo):
+        dataTo.objects = list(dataFrom.objects)
+        dataTo.materials = list(dataFrom.materials)
+
+    scene = bpy.context.scene
+    for obj in dataTo.objects:
+        if obj is not None:
+            scene.collection.objects.link(obj)
+
+    scene.rmtc_precision = job['precision']
+    scene.rmtc_remove_material = job['remove_material']
+    scene.rmtc_vectorized_texture = job['vectorized_texture']
+    scene.rmtc_multi_operand = job['multi_operand']
+    scene.rmtc_convex_csg = job['convex_csg']
+    scene.rmtc_solver_policy = job['solver_policy']
+    scene.rmtc_weld = job['weld']
+    scene.rmtc_vertex_cache = job['vertex_cache']
+    scene.rmtc_vertex_cache_size = job['vertex_cache_size']
+
+    levelCollection = get_add_collection(scene, 'ROOMantic_LEVEL')
+    shapeBooleans = {}
+    sectorBooleans = {}
+    convexShapes = {}
+
+    for i, jobRoom in enumerate(job['rooms']):
+        shape = bpy.data.objects[jobRoom['shape']]
+        neighbours = [bpy.data.objects[name]
+                      for name in jobRoom['neighbours']]
+        room, stats = build_room(
+            scene, shape, neighbours, shapeBooleans, sectorBooleans, convexShapes, levelCollection)
+        arrays = room_to_arrays(room)
+        arrays['stats'] = np.array(json.dumps(stats))
+        np.savez(os.path.join(job['output'], 'room_{}.npz'.format(i)), **arrays)
+
+
+def compute_pvs_parallel(portals, mightRooms, roomCount, eps, workerCount):
+    # flow the rooms in background blender workers, the job is the portal arrays alone
+    # returns {room index: (visible, seconds)} of the rooms the workers delivered
+    roomPortals = portals[4]
+    results = {}
+    tempDir = tempfile.mkdtemp(prefix='roomantic_')
+    try:
+        portalsPath = os.path.join(tempDir, 'portals.npz')
+        save_pvs_portals(portalsPath, portals, mightRooms)
+
+        # balance by portal count, every portal starts a flow
+        jobs = [[] for i in range(min(workerCount, roomCount))]
+        loads = [0] * len(jobs)
+        for room in sorted(range(roomCount), key=lambda room: len(roomPortals[room]), reverse=True):
+            i = loads.index(min(loads))
+            jobs[i].append(room)
+            loads[i] += 1 + len(roomPortals[room])
+
+        workers = []
+        for i, jobRooms in enumerate(jobs):
+            job = {
+                'portals': portalsPath,
+                'output': os.path.join(tempDir, 'pvs_{}.npz'.format(i)),
+                'eps': eps,
+                'rooms': jobRooms,
+            }
+            jobPath = os.path.join(tempDir, 'pvs_job_{}.json'.format(i))
+            with open(jobPath, 'w') as f:
+                json.dump(job, f)
+            process, log = start_worker(
+                ['--pvs-worker', jobPath], os.path.join(tempDir, 'pvs_worker_{}.log'.format(i)))
+            workers.append((process, log, job))
+
+        # merge
+        for process, log, job in workers:
+            process.wait()
+            log.close()
+            if process.returncode != 0 or not os.path.exists(job['output']):
+                with open(log.name) as f:
+                    print(f.read())
+                print("roomantic: pvs worker failed, its rooms are flowed serially")
+                continue
+            with np.load(job['output']) as arrays:
+                for room, visible, seconds in zip(job['rooms'], arrays['visible'], arrays['seconds']):
+                    results[room] = (visible, float(seconds))
+    finally:
+        shutil.rmtree(tempDir, ignore_errors=True)
+
+    print("roomantic: {} pvs workers flowed {} of {} rooms".format(
+        len(jobs), len(results), roomCount))
+    return results
+
+
+def run_pvs_worker(jobPath):
+    # background worker: flow the job rooms from the saved portal arrays, needs no scene
+    with open(jobPath) as f:
+        job = json.load(f)
+    portals, mightRooms = load_pvs_portals(job['portals'])
+    roomCount = mightRooms.shape[1]
+
+    visible = np.zeros((len(job['rooms']), roomCount), dtype=bool)
+    seconds = np.zeros(len(job['rooms']))
+    for i, room in enumerate(job['rooms']):
+        start = time.perf_counter()
+        visible[i] = get_room_pvs(room, portals, mightRooms, roomCount, job['eps'])
+        seconds[i] = time.perf_counter() - start
+    np.savez(job['output'], visible=visible, seconds=seconds)
+
+
+def get_material_image(material):
+    # first image texture of a material, what open material sets up
+    if material is None or not material.use_nodes or material.node_tree is None:
+        return None
+    for node in material.node_tree.nodes:
+        if node.type == 'TEX_IMAGE' and node.image is not None and node.image.size[0] > 0 and node.image.size[1] > 0:
+            return node.image
+    return None
+
+
+def pack_atlas(sizes, atlasSize, padding):
+    # shelf packing of (width, height) into square pages, tallest first
+    # returns (page, x, y) per size, None when it doesn't fit a page
+    placements = [None] * len(sizes)
+    order = sorted(range(len(sizes)),
+                   key=lambda i: (-sizes[i][1], -sizes[i][0], i))
+    page, x, y, shelfHeight = 0, 0, 0, 0
+    for i in order:
+        width = sizes[i][0] + padding * 2
+        height = sizes[i][1] + padding * 2
+        if width > atlasSize or height > atlasSize:
+            continue
+        if x + width > atlasSize:
+            x = 0
+            y += shelfHeight
+            shelfHeight = 0
+        if y + height > atlasSize:
+            page += 1
+            x, y, shelfHeight = 0, 0, 0
+        placements[i] = (page, x + padding, y + padding)
+        x += width
+        shelfHeight = max(shelfHeight, height)
+    return placements
+
+
+def create_atlas_page(name, images, atlasSize, padding, key):
+    # images as (image, x, y), borders are padded with edge pixels against bleeding
+    atlas = bpy.data.images.get(name)
+    if atlas is not None and atlas.get('rmtc_atlas_key') == key:
+        return atlas
+    if atlas is not None:
+        bpy.data.images.remove(atlas)
+    atlas = bpy.data.images.new(name, atlasSize, atlasSize, alpha=True)
+
+    pixels = np.zeros((atlasSize, atlasSize, 4), dtype=np.float32)
+    for image, x, y in images:
+        width, height = image.size
+        imagePixels = np.empty(width * height * 4, dtype=np.float32)
+        image.pixels.foreach_get(imagePixels)
+        imagePixels = np.pad(imagePixels.reshape(height, width, 4),
+                             ((padding, padding), (padding, padding), (0, 0)), mode='edge')
+        pixels[y - padding:y + height + padding,
+               x - padding:x + width + padding] = imagePixels
+
+    atlas.pixels.foreach_set(pixels.ravel())
+    atlas.pack()
+    atlas['rmtc_atlas_key'] = key
+    return atlas
+
+
+def get_atlas_material(atlas):
+    # tiling uv wrapped into the face rect: fract(uv) * scale + offset
+    material = bpy.data.materials.get(atlas.name)
+    if material is None:
+        material = bpy.data.materials.new(atlas.name)
+    material.use_nodes = True
+    material.preview_render_type = 'FLAT'
+
+    nodes = material.node_tree.nodes
+    links = material.node_tree.links
+    links.clear()
+    nodes.clear()
+
+    # create nodes
+    bsdfNode = nodes.new('ShaderNodeBsdfPrincipled')
+    outputNode = nodes.new('ShaderNodeOutputMaterial')
+    texImageNode = nodes.new('ShaderNodeTexImage')
+    texImageNode.image = atlas
+    texImageNode.extension = 'CLIP'
+    uvNode = nodes.new('ShaderNodeUVMap')
+    offsetNode = nodes.new('ShaderNodeUVMap')
+    offsetNode.uv_map = 'rmtc_atlas_offset'
+    scaleNode = nodes.new('ShaderNodeUVMap')
+    scaleNode.uv_map = 'rmtc_atlas_scale'
+    fractionNode = nodes.new('ShaderNodeVectorMath')
+    fractionNode.operation = 'FRACTION'
+    rectNode = nodes.new('ShaderNodeVectorMath')
+    rectNode.operation = 'MULTIPLY_ADD'
+
+    # create node links
+    links.new(uvNode.outputs['UV'], fractionNode.inputs[0])
+    links.new(fractionNode.outputs['Vector'], rectNode.inputs[0])
+    links.new(scaleNode.outputs['UV'], rectNode.inputs[1])
+    links.new(offsetNode.outputs['UV'], rectNode.inputs[2])
+    links.new(rectNode.outputs['Vector'], texImageNode.inputs['Vector'])
+    links.new(bsdfNode.outputs['BSDF'], outputNode.inputs['Surface'])
+    links.new(bsdfNode.inputs['Base Color'], texImageNode.outputs['Color'])
+
+    # some params
+    bsdfNode.inputs['Roughness'].default_value = 0
+    bsdfNode.inputs['Specular'].default_value = 0
+    return material
+
+
+def get_room_source_materials(mesh):
+    # material names + per face index from before the atlas, remembered on first use
+    if 'rmtc_source_materials' not in mesh:
+        mesh['rmtc_source_materials'] = json.dumps(
+            [m.name if m else '' for m in mesh.materials])
+        materialIndices = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get('material_index', materialIndices)
+        mesh.attributes.new('rmtc_source_material', 'INT',
+                            'FACE').data.foreach_set('value', materialIndices)
+
+    sourceIndices = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.attributes['rmtc_source_material'].data.foreach_get(
+        'value', sourceIndices)
+    return json.loads(mesh['rmtc_source_materials']), sourceIndices
+
+
+def set_room_materials(mesh, materials, sourceIndices):
+    # materials deduplicated into slots, faces follow their source material
+    slots = []
+    for material in materials:
+        if material not in slots:
+            slots.append(material)
+    mesh.materials.clear()
+    for material in slots:
+        mesh.materials.append(material)
+    if len(materials) > 0:
+        sourceSlots = np.array([slots.index(material)
+                                for material in materials], dtype=np.int32)
+        mesh.polygons.foreach_set('material_index', sourceSlots[np.clip(
+            sourceIndices, 0, len(materials) - 1)])
+
+
+def apply_room_atlas(room, materialRects, key):
+    # atlas materials + per face atlas rect uv layers, the tiling uvs stay in the active layer
+    mesh = room.data
+    if mesh.get('rmtc_atlas_key') == key:
+        return
+    sourceNames, sourceIndices = get_room_source_materials(mesh)
+
+    materials = []
+    rects = np.zeros((max(len(sourceNames), sourceIndices.max(initial=0) + 1), 4), dtype=np.float32)
+    rects[:, 2:4] = 1
+    for i, name in enumerate(sourceNames):
+        if name in materialRects:
+            materials.append(materialRects[name][0])
+            rects[i] = materialRects[name][1]
+        else:
+            materials.append(bpy.data.materials.get(name) if name else None)
+    set_room_materials(mesh, materials, sourceIndices)
+
+    loopTotals, loopOrder, loopPolygons = get_polygon_loops(mesh)
+    loopRects = rects[sourceIndices[loopPolygons]]
+    activeIndex = mesh.uv_layers.active_index
+    for name, columns in (('rmtc_atlas_offset', loopRects[:, 0:2]), ('rmtc_atlas_scale', loopRects[:, 2:4])):
+        uvLayer = mesh.uv_layers.get(name)
+        if uvLayer is None:
+            uvLayer = mesh.uv_layers.new(name=name, do_init=False)
+        uvLayer.data.foreach_set('uv', np.ascontiguousarray(columns).ravel())
+    if activeIndex >= 0:
+        mesh.uv_layers.active_index = activeIndex
+        mesh.uv_layers[activeIndex].active_render = True
+    mesh['rmtc_atlas_key'] = key
+
+
+def remove_room_atlas(room):
+    # back to the source materials
+    mesh = room.data
+    if 'rmtc_atlas_key' not in mesh:
+        return
+    sourceNames, sourceIndices = get_room_source_materials(mesh)
+    set_room_materials(mesh, [bpy.data.materials.get(name) if name else None
+                              for name in sourceNames], sourceIndices)
+    for name in ('rmtc_atlas_offset', 'rmtc_atlas_scale'):
+        if name in mesh.uv_layers:
+            mesh.uv_layers.remove(mesh.uv_layers[name])
+    del mesh['rmtc_atlas_key']
+
+
+def count_draw_calls(rooms, source=False):
+    # one draw call per used material per room + the distinct materials used
+    # source counts what the rooms had before the atlas
+    drawCalls = 0
+    materials = set()
+    for room in rooms:
+        mesh = room.data
+        if source:
+            names, materialIndices = get_room_source_materials(mesh)
+        else:
+            names = [m.name if m else '' for m in mesh.materials]
+            materialIndices = np.empty(len(mesh.polygons), dtype=np.int32)
+            mesh.polygons.foreach_get('material_index', materialIndices)
+        for index in np.unique(materialIndices).tolist():
+            drawCalls += 1
+            if index < len(names):
+                materials.add(names[index])
+    return drawCalls, len(materials)
+
+
+def apply_texture_atlas(scene, rooms):
+    # pack the images of the room materials into atlas pages and move the rooms onto them
+    # returns (draw calls, materials) before and after
+    before = count_draw_calls(rooms, source=True)
+
+    # images in name order, so the same inputs give the same layout
+    materialImages = {}
+    for room in rooms:
+        for name in get_room_source_materials(room.data)[0]:
+            image = get_material_image(bpy.data.materials.get(name))
+            if image is not None:
+                materialImages[name] = image
+    images = sorted(set(materialImages.values()), key=lambda image: image.name)
+    atlasSize = scene.rmtc_atlas_size
+    padding = scene.rmtc_atlas_padding
+    placements = pack_atlas([tuple(image.size)
+                            for image in images], atlasSize, padding)
+
+    key = hashlib.blake2b(repr((
+        atlasSize, padding,
+        [(image.name, tuple(image.size), placement) for image, placement in zip(images, placements)],
+    )).encode(), digest_size=16).hexdigest()
+
+    pages = {}
+    imageRects = {}
+    for image, placement in zip(images, placements):
+        if placement is None:
+            print("roomantic: {} does not fit an atlas page".format(image.name))
+            continue
+        page, x, y = placement
+        pages.setdefault(page, []).append((image, x, y))
+        imageRects[image] = (page, (x / atlasSize, y / atlasSize,
+                             image.size[0] / atlasSize, image.size[1] / atlasSize))
+
+    atlasMaterials = {}
+    for page, pageImages in pages.items():
+        atlas = create_atlas_page(
+            'rmtc_atlas_{}'.format(page), pageImages, atlasSize, padding, key)
+        atlasMaterials[page] = get_atlas_material(atlas)
+
+    materialRects = {}
+    for name, image in materialImages.items():
+        if image in imageRects:
+            page, rect = imageRects[image]
+            materialRects[name] = (atlasMaterials[page], rect)
+
+    for room in rooms:
+        apply_room_atlas(room, materialRects, key)
+    return before, count_draw_calls(rooms)
+
+
+# level file: little-endian, every block 16-byte aligned so it can be mmapped and uploaded as is
+#   header, material names, room table, then per room: positions, normals, uvs,
+#   [atlas rects], triangle indices and triangle material ids, then the portal table, portal points
+#   and one pvs bit row per room
+level_magic = b'RMTCLVL\0'
+level_version = 3
+level_header = struct.Struct('<8sIIIIQQIIQQQI4x')
+level_material = struct.Struct('<64s')
+level_room = struct.Struct('<64sIII4x6Q6f')
+level_room_atlas = 1
+level_portal = struct.Struct('<IIII4f')
+
+
+def align_file(f, alignment=16):
+    padding = -f.tell() % alignment
+    if padding > 0:
+        f.write(b'\0' * padding)
+    return f.tell()
+
+
+def get_room_export_arrays(room, materialIds):
+    # triangulated, world space, one vertex per unique (vertex, normal, uv) corner
+    mesh = room.data
+    mesh.calc_loop_triangles()
+    mesh.calc_normals_split()
+    loopCount = len(mesh.loops)
+
+    triLoops = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get('loops', triLoops)
+    triPolygons = np.empty(len(mesh.loop_triangles), dtype=np.int32)
+    mesh.loop_triangles.foreach_get('polygon_index', triPolygons)
+    materialIndices = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('material_index', materialIndices)
+    loopVerts = np.empty(loopCount, dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVerts)
+    loopNormals = np.empty(loopCount * 3, dtype=np.float32)
+    mesh.loops.foreach_get('normal', loopNormals)
+
+    columns = [loopVerts[:, None].view(np.float32),
+               loopNormals.reshape(-1, 3)]
+    for name in (None, 'rmtc_atlas_offset', 'rmtc_atlas_scale'):
+        uvLayer = mesh.uv_layers.active if name is None else mesh.uv_layers.get(
+            name)
+        uvs = np.zeros(loopCount * 2, dtype=np.float32)
+        if uvLayer is not None:
+            uvLayer.data.foreach_get('uv', uvs)
+        elif name is not None:
+            break
+        columns.append(uvs.reshape(-1, 2))
+    corners = np.ascontiguousarray(np.hstack(columns))
+    width = corners.shape[1]
+
+    # shared corners become one vertex
+    corners, indices = np.unique(corners.view(
+        np.dtype((np.void, width * 4))), return_inverse=True)
+    corners = corners.view(np.float32).reshape(-1, width)
+    indices = indices.reshape(-1)[triLoops]
+
+    # vertices in first use order, unique sorts them by bytes
+    firstUse = np.full(len(corners), len(indices))
+    np.minimum.at(firstUse, indices, np.arange(len(indices)))
+    cornerOrder = np.argsort(firstUse, kind='stable')
+    remap = np.empty(len(corners), dtype=np.uint32)
+    remap[cornerOrder] = np.arange(len(corners))
+    corners = corners[cornerOrder]
+    indices = remap[indices]
+
+    mat = np.array(room.matrix_world, dtype=np.float64)
+    normalMat = np.linalg.inv(mat[0:3, 0:3]).T
+    normals = corners[:, 1:4] @ normalMat.T
+    normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]
+
+    roomMaterials = np.array([materialIds.get(m.name if m else '', 0)
+                             for m in mesh.materials] + [0], dtype=np.uint32)
+    arrays = {
+        'positions': transform_coords(mat, get_mesh_coords(mesh)[np.ascontiguousarray(corners[:, 0]).view(np.int32)]).astype(np.float32),
+        'normals': normals.astype(np.float32),
+        'uvs': corners[:, 4:6],
+        'indices': indices,
+        'materials': roomMaterials[np.minimum(materialIndices[triPolygons], len(mesh.materials))],
+    }
+    if corners.shape[1] > 6:
+        arrays['atlas'] = corners[:, 6:10]
+    return arrays
+
+
+def export_level(path, rooms):
+    # streams the rooms one at a time, the room table is filled in at the end
+    materialNames = ['']
+    for room in rooms:
+        for material in room.data.materials:
+            if material is not None and material.name not in materialNames:
+                materialNames.append(material.name)
+    materialIds = {name: i for i, name in enumerate(materialNames)}
+
+    with open(path, 'wb') as f:
+        f.write(b'\0' * level_header.size)
+        materialOffset = align_file(f)
+        for name in materialNames:
+            f.write(level_material.pack(name.encode('utf-8')[:63]))
+        roomTableOffset = align_file(f)
+        f.write(b'\0' * (level_room.size * len(rooms)))
+
+        entries = []
+        for room in rooms:
+            arrays = get_room_export_arrays(room, materialIds)
+            offsets = []
+            for key in ('positions', 'normals', 'uvs', 'atlas', 'indices', 'materials'):
+                if key not in arrays:
+                    offsets.append(0)
+                    continue
+                offsets.append(align_file(f))
+                f.write(np.ascontiguousarray(arrays[key]).tobytes())
+
+            positions = arrays['positions']
+            bounds = np.concatenate((positions.min(axis=0), positions.max(axis=0))) if len(
+                positions) > 0 else np.zeros(6)
+            entries.append(level_room.pack(
+                room.name.encode('utf-8')[:63],
+                len(positions), len(arrays['materials']),
+                level_room_atlas if 'atlas' in arrays else 0,
+                *offsets, *bounds.tolist()))
+
+        # portals between exported rooms
+        roomIds = {room.name: i for i, room in enumerate(rooms)}
+        portalEntries = []
+        portalPoints = []
+        portalGraph = get_portal_graph(rooms)
+        for i, room in enumerate(rooms):
+            for portal in portalGraph[room.name]:
+                if portal['room'] in roomIds:
+                    portalEntries.append(level_portal.pack(
+                        i, roomIds[portal['room']], len(portalPoints), len(portal['points']), *portal['plane']))
+                    portalPoints.extend(portal['points'])
+        portalTableOffset = align_file(f)
+        for entry in portalEntries:
+            f.write(entry)
+        portalPointOffset = align_file(f)
+        f.write(np.array(portalPoints, dtype=np.float32).tobytes())
+
+        # pvs rows over the exported rooms, rooms without a pvs see everything
+        pvs = np.ones((len(rooms), len(rooms)), dtype=bool)
+        for i, room in enumerate(rooms):
+            visibleNames = get_room_pvs_names(room)
+            if visibleNames is not None:
+                pvs[i] = False
+                pvs[i, [roomIds[name] for name in visibleNames if name in roomIds]] = True
+        pvsRows = np.packbits(pvs, axis=1, bitorder='little')
+        pvsOffset = align_file(f)
+        f.write(pvsRows.tobytes())
+
+        f.seek(0)
+        f.write(level_header.pack(level_magic, level_version, len(rooms), len(materialNames), 0,
+                                  materialOffset, roomTableOffset,
+                                  len(portalEntries), len(portalPoints), portalTableOffset, portalPointOffset,
+                                  pvsOffset, pvsRows.shape[1]))
+        f.seek(roomTableOffset)
+        for entry in entries:
+            f.write(entry)
+
+
+def read_level(path):
+    # reference reader: memory maps the file, room and portal arrays are views into the map
+    # a room's pvs is its packed bit row, bit j set when room j may be visible
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    magic, version, roomCount, materialCount, flags, materialOffset, roomTableOffset, \
+        portalCount, portalPointCount, portalTableOffset, portalPointOffset, \
+        pvsOffset, pvsRowBytes = level_header.unpack_from(data, 0)
+    if magic != level_magic or version != level_version:
+        raise ValueError('not a roomantic level file: ' + path)
+
+    materials = [level_material.unpack_from(data, materialOffset + i * level_material.size)[0].rstrip(b'\0').decode('utf-8')
+                 for i in range(materialCount)]
+    rooms = []
+    for i in range(roomCount):
+        entry = level_room.unpack_from(
+            data, roomTableOffset + i * level_room.size)
+        vertexCount, triangleCount, roomFlags = entry[1:4]
+        offsets = entry[4:10]
+        room = {
+            'name': entry[0].rstrip(b'\0').decode('utf-8'),
+            'bounds': entry[10:16],
+            'positions': np.frombuffer(data, np.float32, vertexCount * 3, offsets[0]).reshape(-1, 3),
+            'normals': np.frombuffer(data, np.float32, vertexCount * 3, offsets[1]).reshape(-1, 3),
+            'uvs': np.frombuffer(data, np.float32, vertexCount * 2, offsets[2]).reshape(-1, 2),
+            'indices': np.frombuffer(data, np.uint32, triangleCount * 3, offsets[4]).reshape(-1, 3),
+            'materials': np.frombuffer(data, np.uint32, triangleCount, offsets[5]),
+            'pvs': np.frombuffer(data, np.uint8, pvsRowBytes, pvsOffset + i * pvsRowBytes),
+        }
+        if roomFlags & level_room_atlas:
+            room['atlas'] = np.frombuffer(
+                data, np.float32, vertexCount * 4, offsets[3]).reshape(-1, 4)
+        rooms.append(room)
+
+    portalPoints = np.frombuffer(
+        data, np.float32, portalPointCount * 3, portalPointOffset).reshape(-1, 3)
+    portals = []
+    for i in range(portalCount):
+        entry = level_portal.unpack_from(
+            data, portalTableOffset + i * level_portal.size)
+        portals.append({
+            'from': entry[0],
+            'to': entry[1],
+            'points': portalPoints[entry[2]:entry[2] + entry[3]],
+            'plane': entry[4:8],
+        })
+    return materials, rooms, portals
+
+
+def get_level_rooms():
+    # built rooms in name order
+    if 'ROOMantic_LEVEL' not in bpy.data.collections:
+        return []
+    return sorted([obj for obj in bpy.data.collections['ROOMantic_LEVEL'].objects
+                   if obj.type == 'MESH' and obj.name.startswith('rmtc_')], key=lambda obj: obj.name)
+
+
+class BuildProfiler:
+    # per-phase and per-room timings of one build, plus optional cProfile stats
+
+    def __init__(self) -> None:
+        self.start = time.time()
+        self.date = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.total = 0
+        self.phases = []
+        self.rooms = []
+        self.counters = {}
+        self.pvs = []
+        self.cprofile = None
+        self.phaseName = None
+        self.phaseStart = 0
+
+    def begin(self, name):
+        self.end()
+        self.phaseName = name
+        self.phaseStart = time.time()
+
+    def end(self):
+        if self.phaseName is None:
+            return
+        seconds = time.time() - self.phaseStart
+        self.phases.append({'name': self.phaseName, 'seconds': seconds})
+        print("roomantic: {} - {:.3f} sec.".format(self.phaseName, seconds))
+        self.phaseName = None
+
+    def count(self, name, value):
+        self.counters[name] = value
+
+    def add_room(self, stats):
+        self.rooms.append(stats)
+
+    def begin_cprofile(self, enabled):
+        if enabled:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def finish(self):
+        self.end()
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        self.total = time.time() - self.start
+        print("roomantic: build done - {:.3f} sec.".format(self.total))
+
+    def slowest_rooms(self, count=5):
+        return sorted(self.rooms, key=lambda stats: stats['seconds'], reverse=True)[:count]
+
+    def slowest_pvs_rooms(self, count=5):
+        return sorted(self.pvs, key=lambda stats: stats['seconds'], reverse=True)[:count]
+
+    def to_dict(self):
+        return {
+            'date': self.date,
+            'blend': bpy.data.filepath,
+            'total_seconds': self.total,
+            'phases': self.phases,
+            'counters': self.counters,
+            'rooms': self.rooms,
+            'pvs': self.pvs,
+        }
+
+    def write_report(self, directory):
+        # roomantic_build_<date>.json + .prof when cProfile was on
+        os.makedirs(directory, exist_ok=True)
+        baseName = os.path.join(directory, 'roomantic_build_' +
+                                time.strftime('%Y%m%d_%H%M%S', time.localtime(self.start)))
+        with open(baseName + '.json', 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(baseName + '.prof')
+        print("roomantic: build report - " + baseName + '.json')
+
+
+# profile of the last build, shown in the panel
+last_build_profile = None
+
+
+def build_level_paused(context, selectedOnly, selectedObjs, profiler):
+    # pending edits (scripts, background mode) only reach the registry through a depsgraph update,
+    # flush them first, then keep the build's own edits out of it
+    shape_registry.paused = False
+    context.view_layer.update()
+    shape_registry.paused = True
+    try:
+        build_level(context, selectedOnly, selectedObjs, profiler)
+        context.view_layer.update()
+    finally:
+        shape_registry.paused = False
+
+
+def build_level(context, selectedOnly, selectedObjs, profiler):
+    # The new algo works to achieve this goal: each shape must be its own separate object
+    # So we can no longer rely on a global level_geometry object that gets booleaned around by each shape
+    # we now need to treat each shape separately
+    scene = context.scene
+
+    profiler.begin('cleanup collections')
+
+    # cleanup
+    remove_not_used()
+
+    # only Build All can skip unchanged rooms
+    incremental = scene.rmtc_incremental_build and not selectedOnly
+
+    # make sure remove_materials is present
+    if scene.rmtc_remove_material == '' or scene.rmtc_remove_material is None or scene.rmtc_remove_material not in bpy.data.materials:
+        scene.rmtc_remove_material = create_remove_material().name
+
+    # get collection
+    levelCollection = get_add_collection(scene, 'ROOMantic_LEVEL')
+    levelCollection.hide_select = False
+    shapeCollection = get_add_collection(scene, 'ROOMantic_SHAPES')
+    shapeCollection.hide_select = False
+
+    # clear collections
+    for obj in levelCollection.objects:
+        # unlink only if selected
+        if selectedOnly:
+            fullName = obj.name.split('rmtc_')
+            if len(fullName) == 2:
+                shapeName = fullName[1]
+                for sel in selectedObjs:
+                    if sel.name == shapeName:
+                        unlink_collections_all(obj)
+                        continue
+        elif incremental:
+            # unlink only rooms whose shape is gone
+            fullName = obj.name.split('rmtc_')
+            if len(fullName) == 2:
+                shapeName = fullName[1]
+                if shapeName not in bpy.data.objects or not is_shape(bpy.data.objects[shapeName]):
+                    unlink_collections_all(obj)
+        else:
+            unlink_collections_all(obj)
+
+        # if brush inside this collection, then link it to scene
+        if obj.rmtc_shape_type != 'NONE':
+            link_collection_unique(obj, scene.collection)
+
+    profiler.begin('setting up shapes')
+
+    # look for shapes, the registry also knows which changed since the last build
+    shapes, changedShapes = shape_registry.get_shapes(scene)
+    if not incremental:
+        changedShapes = None
+
+    # a changed build setting makes every stored fingerprint stale
+    buildSettings = get_build_settings_key(scene)
+    if levelCollection.get('rmtc_build_settings') != buildSettings:
+        changedShapes = None
+
+    # if has no geom then skip
+    shapes = [shape for shape in shapes if len(shape.data.vertices) >= 3]
+
+    # loop on shapes
+    for shape in shapes:
+        # update + link shapes, untouched shapes are already up to date
+        if changedShapes is None or shape in changedShapes:
+            update_shape(shape)
+        if list(shape.users_collection) != [shapeCollection]:
+            link_collection_unique(shape, shapeCollection)
+
+    # only selected shapes take part in a selected build
+    if selectedOnly:
+        shapes = [shape for shape in shapes if shape in selectedObjs]
+
+    profiler.begin('fingerprinting shapes')
+
+    # fingerprint shapes: dirty ones changed since their room was built
+    shapeFingerprints = {}
+    dirtyShapes = set()
+    shapeNames = set(shape.name for shape in shapes)
+    for shape in shapes:
+        if changedShapes is not None and shape not in changedShapes and shape.rmtc_fingerprint != '':
+            # not touched since its room was built
+            shapeFingerprints[shape] = shape.rmtc_fingerprint
+        else:
+            shapeFingerprints[shape] = calculate_shape_fingerprint(shape)
+        if not incremental:
+            dirtyShapes.add(shape)
+        elif shapeFingerprints[shape] != shape.rmtc_fingerprint:
+            dirtyShapes.add(shape)
+        elif 'rmtc_' + shape.name not in levelCollection.objects:
+            dirtyShapes.add(shape)
+        elif any(n not in shapeNames for n in get_shape_neighbours(shape)):
+            # a neighbour was deleted or renamed
+            dirtyShapes.add(shape)
+
+    profiler.begin('caching shape data')
+
+    # cache data: shape-boolean + bounds (they are just remove_material blobs)
+    # clean shapes reuse the bounds stored by the last build
+    shapeBooleans = {}
+    shapeBounds = {}
+
+    for shape in shapes:
+        # bounds
+        if shape in dirtyShapes:
+            shapeBounds[shape] = calculate_bounds_ws(
+                shape.matrix_world, get_shape_boolean(shape, shapeBooleans).data, 0.1)
+        else:
+            shapeBounds[shape] = Bounds.from_tuple(shape.rmtc_bounds)
+
+    profiler.begin('creating shape intersection tables')
+
+    # shape intersect map
+    shapeIntersections = build_intersection_map(shapeBounds)
+    shapeOrder = {shape: i for i, shape in enumerate(shapes)}
+
+    # narrow phase: drop aabb pairs that don't actually touch
+    convexShapes = {}
+    if scene.rmtc_narrow_phase:
+        culledPairs = narrow_intersection_map(
+            shapeIntersections, dirtyShapes, shapeBooleans, convexShapes,
+            get_convex_eps(scene), 10 ** -scene.rmtc_precision)
+        profiler.count('culled pairs', culledPairs)
+        print("roomantic: narrow phase culled {} pairs".format(culledPairs))
+
+    profiler.begin('performing csg')
+
+    # rooms to rebuild: dirty shapes + their old and new neighbours
+    rebuildShapes = set(dirtyShapes)
+    for shape in dirtyShapes:
+        rebuildShapes.update(shapeIntersections[shape])
+        for name in get_shape_neighbours(shape):
+            if name in shapeNames:
+                rebuildShapes.add(bpy.data.objects[name])
+    rebuildShapes = [shape for shape in shapes if shape in rebuildShapes]
+
+    profiler.count('shapes', len(shapes))
+    profiler.count('dirty shapes', len(dirtyShapes))
+    profiler.count('rebuilt rooms', len(rebuildShapes))
+    print("roomantic: rebuilding {} of {} rooms".format(
+        len(rebuildShapes), len(shapes)))
+
+    # neighbours in shape order so builds are repeatable
+    neighbourMap = {shape0: sorted(shapeIntersections[shape0], key=shapeOrder.get)
+                    for shape0 in rebuildShapes}
+
+    # restore rooms whose inputs were built before from the on-disk cache
+    cacheDir = get_build_cache_dir(scene)
+    roomKeys = {}
+    buildShapes = rebuildShapes
+    if cacheDir is not None:
+        profiler.begin('restoring cached rooms')
+        buildShapes = []
+        for shape0 in rebuildShapes:
+            roomKeys[shape0] = room_cache_key(
+                scene, shape0, neighbourMap[shape0], shapeFingerprints)
+            room = load_cached_room(
+                cacheDir, roomKeys[shape0], 'rmtc_' + shape0.name)
+            if room is None:
+                buildShapes.append(shape0)
+            else:
+                link_collection_unique(room, levelCollection)
+        profiler.count('cache hits', len(rebuildShapes) - len(buildShapes))
+        profiler.begin('performing csg')
+
+    # farm rooms out to background workers, whatever fails is built here
+    serialShapes = buildShapes
+    if scene.rmtc_parallel_build and len(buildShapes) > 1:
+        builtShapes = build_rooms_parallel(
+            context, shapes, buildShapes, neighbourMap,
+            levelCollection, scene.rmtc_parallel_workers, profiler)
+        serialShapes = [
+            shape for shape in buildShapes if shape not in builtShapes]
+
+    # brushes intersect with the union of the sectors around them
+    sectorBooleans = {}
+
+    # create/duplicate shapes to output
+    for shape0 in serialShapes:
+        room, stats = build_room(
+            scene, shape0, neighbourMap[shape0], shapeBooleans, sectorBooleans, convexShapes, levelCollection)
+        profiler.add_room(stats)
+
+    # weld totals of the rooms built in this run, per room counts are in the room stats
+    weldStats = [stats for stats in profiler.rooms if 'weld_verts_before' in stats]
+    if len(weldStats) > 0:
+        for key in ('weld_verts_before', 'weld_verts_after', 'weld_tris_before', 'weld_tris_after'):
+            profiler.count(key.replace('_', ' '), sum(stats[key] for stats in weldStats))
+        print("roomantic: welding - {} -> {} verts, {} -> {} triangles in {} rooms".format(
+            profiler.counters['weld verts before'], profiler.counters['weld verts after'],
+            profiler.counters['weld tris before'], profiler.counters['weld tris after'], len(weldStats)))
+
+    # triangle weighted acmr of the rooms built in this run, per room values are in the room stats
+    acmrStats = [stats for stats in profiler.rooms if 'acmr_before' in stats]
+    if len(acmrStats) > 0:
+        triangles = max(sum(stats['faces_out'] for stats in acmrStats), 1)
+        for key in ('acmr_before', 'acmr_after'):
+            profiler.count(key.replace('_', ' '), sum(
+                stats[key] * stats['faces_out'] for stats in acmrStats) / triangles)
+        print("roomantic: vertex cache - acmr {:.3f} -> {:.3f} in {} rooms".format(
+            profiler.counters['acmr before'], profiler.counters['acmr after'], len(acmrStats)))
+
+    if cacheDir is not None and len(buildShapes) > 0:
+        profiler.begin('updating build cache')
+        for shape0 in buildShapes:
+            store_cached_room(
+                cacheDir, roomKeys[shape0], bpy.data.objects['rmtc_' + shape0.name])
+        evict_build_cache(cacheDir, scene.rmtc_build_cache_size * 1024 * 1024)
+
+    # portals of the rebuilt rooms and of rooms without any stored yet
+    rooms = sorted((room for room in levelCollection.objects if room.type == 'MESH'),
+                   key=lambda room: room.name)
+    if scene.rmtc_portals:
+        profiler.begin('extracting portals')
+        rebuildSet = set(rebuildShapes)
+        shapeCollisions = {}
+        portalCount = 0
+        tolerance = 10 ** -scene.rmtc_precision
+        for shape0 in shapes:
+            room = levelCollection.objects.get('rmtc_' + shape0.name)
+            if room is None or (shape0 not in rebuildSet and 'rmtc_portals' in room):
+                continue
+            portals = []
+            if shape0.rmtc_shape_type != 'BRUSH':
+                neighbours = [shape1 for shape1 in sorted(shapeIntersections[shape0], key=shapeOrder.get)
+                              if shape1.rmtc_shape_type != 'BRUSH']
+                portals = extract_room_portals(
+                    shape0, room, neighbours, shapeBooleans, shapeCollisions, tolerance)
+            room['rmtc_portals'] = json.dumps(portals)
+            portalCount += len(portals)
+        profiler.count('extracted portals', portalCount)
+    else:
+        for room in rooms:
+            if 'rmtc_portals' in room:
+                del room['rmtc_portals']
+
+    # pvs of the whole level, kept while the portal graph is unchanged
+    if scene.rmtc_portals and scene.rmtc_pvs:
+        profiler.begin('computing pvs')
+        eps = 10 ** -scene.rmtc_precision
+        pvsKey = hashlib.blake2b(json.dumps(
+            [eps] + [[room.name, room.get('rmtc_portals', '')] for room in rooms]).encode('utf-8'), digest_size=16).hexdigest()
+        if levelCollection.get('rmtc_pvs_key') == pvsKey and all('rmtc_pvs' in room for room in rooms):
+            print("roomantic: pvs up to date")
+        else:
+            workerCount = scene.rmtc_parallel_workers if scene.rmtc_parallel_build else 1
+            roomNames, pvs, timings, portalCount = compute_level_pvs(
+                rooms, eps, workerCount)
+            for room in rooms:
+                room['rmtc_pvs'] = pack_room_pvs(pvs[room.name])
+            levelCollection['rmtc_pvs_rooms'] = json.dumps(roomNames)
+            levelCollection['rmtc_pvs_key'] = pvsKey
+            profiler.pvs = timings
+            visibleAverage = sum(stats['visible'] for stats in timings) / max(len(timings), 1)
+            profiler.count('pvs rooms', len(timings))
+            profiler.count('pvs portals', portalCount)
+            profiler.count('pvs visible average', visibleAverage)
+            print("roomantic: pvs - {} rooms, {} portals, {:.1f} visible rooms on average".format(
+                len(timings), portalCount, visibleAverage))
+            for stats in profiler.slowest_pvs_rooms():
+                print("roomantic: pvs {} - {:.3f} sec. - {} visible".format(
+                    stats['name'], stats['seconds'], stats['visible']))
+    else:
+        for room in rooms:
+            if 'rmtc_pvs' in room:
+                del room['rmtc_pvs']
+
+    for shape0 in rebuildShapes:
+        # remember inputs for the next incremental build
+        # a selected build only knows part of the level, so force a rebuild next time
+        shape0.rmtc_fingerprint = '' if selectedOnly else shapeFingerprints[shape0]
+        set_shape_neighbours(shape0, shapeIntersections[shape0])
+        shape0.rmtc_bounds = shapeBounds[shape0].to_tuple()
+    shape_registry.mark_built(shapes)
+    if not selectedOnly:
+        levelCollection['rmtc_build_settings'] = buildSettings
+
+    # atlas covers every room of the level, rooms already on the current layout are skipped
+    if scene.rmtc_texture_atlas:
+        profiler.begin('packing texture atlas')
+        before, after = apply_texture_atlas(scene, rooms)
+        profiler.count('draw calls before atlas', before[0])
+        profiler.count('draw calls after atlas', after[0])
+        profiler.count('materials before atlas', before[1])
+        profiler.count('materials after atlas', after[1])
+        print("roomantic: texture atlas - {} -> {} draw calls, {} -> {} materials".format(
+            before[0], after[0], before[1], after[1]))
+    else:
+        for room in rooms:
+            remove_room_atlas(room)
+
+    profiler.end()
+
+    # unlink sectorBooleans
+    unlink_sector_booleans(sectorBooleans)
+
+    # mark unselectable
+    levelCollection.hide_select = True
+    if 'rmtc_stale' in levelCollection:
+        del levelCollection['rmtc_stale']
+
+
+class LiveBuilder:
+    # live mode: rooms around edited shapes are rebuilt in small time slices from a timer
+    # the queue holds names, objects may be gone by the time a slice runs
 
-    mod = shape.modifiers.new(name='triangulate', type='TRIANGULATE')
-    bpy.ops.object.modifier_apply(modifier='triangulate')
+    def __init__(self) -> None:
+        self.changedNames = set()
+        self.lastEdit = 0
+        self.rooms = []
+        self.shapeFingerprints = {}
+        self.shapeBounds = {}
+        self.shapeBooleans = {}
+        self.sectorBooleans = {}
+        self.convexShapes = {}
+        self.oldMeshes = []
+
+    def queue(self, scene, names):
+        self.changedNames |= names
+        self.lastEdit = time.time()
+        if not bpy.app.timers.is_registered(_live_build_tick):
+            bpy.app.timers.register(
+                _live_build_tick, first_interval=scene.rmtc_live_delay)
+
+    def clear(self):
+        self.finish()
+        self.changedNames.clear()
+        self.rooms = []
+        self.shapeBooleans = {}
+        self.convexShapes = {}
+
+    def plan(self, scene):
+        # changed shapes whose fingerprint moved + their old and new neighbours
+        objects = bpy.data.objects
+        changedShapes = []
+        for name in list(self.changedNames):
+            shape = objects.get(name)
+            if shape is None or not is_shape(shape) or len(shape.data.vertices) < 3:
+                self.changedNames.discard(name)
+            elif shape.mode != 'EDIT':
+                self.changedNames.discard(name)
+                changedShapes.append(shape)
+
+        self.shapeFingerprints = {}
+        dirtyShapes = []
+        for shape in changedShapes:
+            update_shape(shape)
+            self.shapeFingerprints[shape.name] = calculate_shape_fingerprint(
+                shape)
+            if self.shapeFingerprints[shape.name] != shape.rmtc_fingerprint:
+                dirtyShapes.append(shape)
+        if len(dirtyShapes) == 0:
+            return
+
+        # fresh booleans for this batch, the meshes of the last batch get dropped in finish
+        self.oldMeshes = [boolean.data for boolean in self.shapeBooleans.values()]
+        self.shapeBooleans = {}
+        self.sectorBooleans = {}
+        self.convexShapes = {}
+
+        shapes = [shape for shape in shape_registry.get_shapes(scene)[0]
+                  if len(shape.data.vertices) >= 3]
+        shapeBounds = {}
+        for shape in shapes:
+            if shape in dirtyShapes or shape.rmtc_fingerprint == '':
+                shapeBounds[shape] = calculate_bounds_ws(
+                    shape.matrix_world, get_shape_boolean(shape, self.shapeBooleans).data, 0.1)
+            else:
+                shapeBounds[shape] = Bounds.from_tuple(shape.rmtc_bounds)
+        shapeIntersections = build_intersection_map(shapeBounds)
+        if scene.rmtc_narrow_phase:
+            narrow_intersection_map(shapeIntersections, set(dirtyShapes) | {shape for shape in shapes if shape.rmtc_fingerprint == ''},
+                                    self.shapeBooleans, self.convexShapes, get_convex_eps(scene), 10 ** -scene.rmtc_precision)
+
+        rebuildShapes = set(dirtyShapes)
+        for shape in dirtyShapes:
+            rebuildShapes.update(shapeIntersections[shape])
+            for name in get_shape_neighbours(shape):
+                if name in objects and objects[name] in shapeIntersections:
+                    rebuildShapes.add(objects[name])
+
+        self.shapeBounds = {shape.name: shapeBounds[shape].to_tuple()
+                            for shape in rebuildShapes}
+        self.rooms = [(shape.name, sorted(n.name for n in shapeIntersections[shape]))
+                      for shape in shapes if shape in rebuildShapes]
+
+    def build_next(self, scene):
+        shapeName, neighbourNames = self.rooms.pop(0)
+        objects = bpy.data.objects
+        if shapeName not in objects or any(name not in objects for name in neighbourNames):
+            return
+        shape0 = objects[shapeName]
+        if shape0.mode == 'EDIT':
+            # picked up again once edit mode is left
+            self.changedNames.add(shapeName)
+            return
+        neighbours = [objects[name] for name in neighbourNames]
+
+        roomName = 'rmtc_' + shapeName
+        oldMesh = objects[roomName].data if roomName in objects else None
+        levelCollection = get_add_collection(scene, 'ROOMantic_LEVEL')
+        room, stats = build_room(scene, shape0, neighbours, self.shapeBooleans, self.sectorBooleans, self.convexShapes,
+                                 levelCollection)
+        if oldMesh is not None and oldMesh.users == 0:
+            bpy.data.meshes.remove(oldMesh)
+
+        # portals, pvs and atlas rects of the old geometry are gone, the next Build All redoes them
+        if 'rmtc_portals' in room:
+            del room['rmtc_portals']
+        for levelRoom in levelCollection.objects:
+            if 'rmtc_pvs' in levelRoom:
+                del levelRoom['rmtc_pvs']
+        levelCollection['rmtc_stale'] = True
+
+        # same bookkeeping as a build, so Build All skips these rooms
+        if shapeName in self.shapeFingerprints:
+            shape0.rmtc_fingerprint = self.shapeFingerprints[shapeName]
+            shape_registry.mark_built([shape0])
+        shape0.rmtc_neighbours = json.dumps(neighbourNames)
+        shape0.rmtc_bounds = self.shapeBounds[shapeName]
+
+    def finish(self):
+        # drop the sector unions and the boolean meshes replaced by this batch
+        shapeBooleans = set(self.shapeBooleans.values())
+        for sectorBoolean in self.sectorBooleans.values():
+            if sectorBoolean not in shapeBooleans:
+                mesh = sectorBoolean.data
+                bpy.data.objects.remove(sectorBoolean, do_unlink=True)
+                bpy.data.meshes.remove(mesh)
+        self.sectorBooleans = {}
+        for mesh in self.oldMeshes:
+            if mesh.users == 0:
+                bpy.data.meshes.remove(mesh)
+        self.oldMeshes = []
+
+    def tick(self, context):
+        # returns seconds until the next slice, None stops the timer
+        scene = context.scene
+        if not scene.rmtc_live_build or scene.rmtc_remove_material not in bpy.data.materials:
+            self.clear()
+            return None
+
+        wait = self.lastEdit + scene.rmtc_live_delay - time.time()
+        if len(self.rooms) == 0 and wait > 0:
+            return wait
+
+        shape_registry.paused = True
+        try:
+            if len(self.rooms) == 0:
+                self.plan(scene)
+            start = time.time()
+            while len(self.rooms) > 0:
+                self.build_next(scene)
+                if (time.time() - start) * 1000 >= scene.rmtc_live_budget:
+                    break
+            if len(self.rooms) == 0:
+                self.finish()
+            context.view_layer.update()
+        finally:
+            shape_registry.paused = False
+
+        if len(self.rooms) > 0:
+            return 0.01
+        if len(self.changedNames) > 0:
+            # shapes still in edit mode
+            return max(scene.rmtc_live_delay, 0.1)
+        return None
+
+
+live_builder = LiveBuilder()
+
+
+def _live_build_tick():
+    return live_builder.tick(bpy.context)
+
+
+def _update_live_build(self, context):
+    if not self.rmtc_live_build:
+        live_builder.clear()
 
 
 def apply_split_faces(shape):
@@ -470,6 +3627,94 @@ def apply_split_faces(shape):
     shape.select_set(True)
 
 
+def rip_faces(obj, faces):
+    # copy bmesh faces into a new shape next to obj, with its rmtc_* props, modifiers and materials
+    # index maps are dicts so this stays linear in the face count
+    vertIndices = {}
+    pyVerts = []
+    pyFaces = []
+    for f in faces:
+        currentFaceIndices = []
+        for v in f.verts:
+            if v not in vertIndices:
+                vertIndices[v] = len(pyVerts)
+                pyVerts.append(v.co.copy())
+            currentFaceIndices.append(vertIndices[v])
+        pyFaces.append(currentFaceIndices)
+
+    ripedMesh = bpy.data.meshes.new(name='riped_mesh')
+    if len(pyFaces) > 0:
+        ripedMesh.from_pydata(pyVerts, [], pyFaces)
+        ripedMesh.polygons.foreach_set(
+            'material_index', [f.material_index for f in faces])
+        ripedMesh.polygons.foreach_set('use_smooth', [f.smooth for f in faces])
+
+    ripedObj = obj.copy()
+    for col in obj.users_collection:
+        col.objects.link(ripedObj)
+    ripedObj.data = ripedMesh
+    copy_materials(obj, ripedObj)
+
+    # a new shape, nothing built for it yet
+    ripedObj.rmtc_fingerprint = ''
+    ripedObj.rmtc_neighbours = ''
+    return ripedObj
+
+
+def remove_riped_faces(obj, bm, faces):
+    # sector2d rips move the faces, the others copy them
+    if obj.rmtc_shape_type != 'SECTOR2D' or len(faces) == 0:
+        return
+
+    edgesToRemove = set()
+    for f in faces:
+        edgesToRemove.update(f.edges)
+
+    for f in faces:
+        bm.faces.remove(f)
+
+    for e in edgesToRemove:
+        if e.is_valid and e.is_wire:
+            bm.edges.remove(e)
+
+    for v in [v for v in bm.verts if len(v.link_edges) == 0 or len(v.link_faces) == 0]:
+        bm.verts.remove(v)
+
+
+def get_face_islands(faces):
+    # groups of faces connected through shared edges
+    faceSet = set(faces)
+    islands = []
+    visited = set()
+    for face in faces:
+        if face in visited:
+            continue
+        visited.add(face)
+        island = [face]
+        stack = [face]
+        while len(stack) > 0:
+            f = stack.pop()
+            for e in f.edges:
+                for linkedFace in e.link_faces:
+                    if linkedFace in faceSet and linkedFace not in visited:
+                        visited.add(linkedFace)
+                        island.append(linkedFace)
+                        stack.append(linkedFace)
+        islands.append(island)
+    return islands
+
+
+def get_face_sets(bm, faces):
+    # groups of faces by sculpt face set, None when the mesh has none (blender 3.5+)
+    layer = bm.faces.layers.int.get('.sculpt_face_set')
+    if layer is None:
+        return None
+    faceSets = {}
+    for f in faces:
+        faceSets.setdefault(f[layer], []).append(f)
+    return [faceSets[key] for key in sorted(faceSets)]
+
+
 # FUNCS
 
 
@@ -487,6 +3732,142 @@ bpy.types.Scene.rmtc_remove_material = bpy.props.StringProperty(
     name="Remove Material",
     description="Material used as flag for removing geometry"
 )
+bpy.types.Scene.rmtc_vectorized_texture = bpy.props.BoolProperty(
+    name="Vectorized Auto Texture",
+    default=True,
+    description='Compute auto texture UVs for all faces at once with NumPy instead of face by face'
+)
+bpy.types.Scene.rmtc_multi_operand = bpy.props.BoolProperty(
+    name="Multi-Operand Booleans",
+    default=True,
+    description='Carve each room with all of its neighbours in a single boolean instead of one boolean per neighbour'
+)
+bpy.types.Scene.rmtc_narrow_phase = bpy.props.BoolProperty(
+    name="Narrow Phase",
+    default=True,
+    description='Test shapes whose bounding boxes overlap for actual contact, so rooms are only carved by neighbours they touch'
+)
+bpy.types.Scene.rmtc_weld = bpy.props.BoolProperty(
+    name="Weld Rooms",
+    default=True,
+    description='Weld room vertices within the precision, snap near equal uvs and remove degenerate and duplicate triangles after the build'
+)
+bpy.types.Scene.rmtc_vertex_cache = bpy.props.BoolProperty(
+    name="Vertex Cache Order",
+    default=False,
+    description='Reorder room triangles for the post-transform vertex cache (tipsify) and vertices by first use'
+)
+bpy.types.Scene.rmtc_vertex_cache_size = bpy.props.IntProperty(
+    name="Cache Size",
+    default=16,
+    min=4,
+    max=64,
+    description='Fifo vertex cache size the triangle order is tuned for'
+)
+bpy.types.Scene.rmtc_convex_csg = bpy.props.BoolProperty(
+    name="Convex Clipping",
+    default=True,
+    description='Carve convex rooms touching only convex neighbours by clipping faces against planes instead of running the boolean solver'
+)
+bpy.types.Scene.rmtc_solver_policy = bpy.props.EnumProperty(
+    items=[
+        ('ADAPTIVE', 'Adaptive', 'Fast solver first, exact again when the result fails validation'),
+        ('EXACT', 'Exact', 'Always use the exact solver'),
+        ('FAST', 'Fast', 'Always use the fast solver, without validation'),
+    ],
+    name="Boolean Solver",
+    default='ADAPTIVE',
+    description='Boolean solver used to carve rooms'
+)
+bpy.types.Scene.rmtc_live_build = bpy.props.BoolProperty(
+    name="Live Build",
+    default=False,
+    description='Rebuild the rooms around edited shapes in the background while editing. Shapes in edit mode wait until edit mode is left',
+    update=_update_live_build
+)
+bpy.types.Scene.rmtc_live_delay = bpy.props.FloatProperty(
+    name="Live Delay",
+    default=0.3,
+    min=0,
+    max=5,
+    subtype='TIME',
+    unit='TIME',
+    description='Seconds without edits before live build starts rebuilding'
+)
+bpy.types.Scene.rmtc_live_budget = bpy.props.FloatProperty(
+    name="Live Budget (ms)",
+    default=30,
+    min=1,
+    max=1000,
+    description='Time slice live build may take before handing control back to the viewport. At least one room is built per slice'
+)
+bpy.types.Scene.rmtc_portals = bpy.props.BoolProperty(
+    name="Portals",
+    default=True,
+    description='Extract the openings between touching rooms as portals (stored in each room as rmtc_portals, exported with the level)'
+)
+bpy.types.Scene.rmtc_pvs = bpy.props.BoolProperty(
+    name="PVS",
+    default=False,
+    description='Compute the potentially visible rooms of every room through its portals (stored in each room as rmtc_pvs, exported with the level)'
+)
+bpy.types.Scene.rmtc_texture_atlas = bpy.props.BoolProperty(
+    name="Texture Atlas",
+    default=False,
+    description='After building, pack the images of the room materials into atlas pages and move the rooms onto atlas materials. The tiling UVs stay, each face gets its atlas rect in the rmtc_atlas_offset/rmtc_atlas_scale UV layers'
+)
+bpy.types.Scene.rmtc_atlas_size = bpy.props.IntProperty(
+    name="Atlas Size",
+    default=4096,
+    min=256,
+    max=16384,
+    description='Width and height of an atlas page in pixels'
+)
+bpy.types.Scene.rmtc_atlas_padding = bpy.props.IntProperty(
+    name="Atlas Padding",
+    default=4,
+    min=0,
+    max=64,
+    description='Pixels of edge color around each image in the atlas, against bleeding between neighbours'
+)
+bpy.types.Scene.rmtc_parallel_build = bpy.props.BoolProperty(
+    name="Parallel Build",
+    default=False,
+    description='Build rooms and flow the pvs in background Blender worker processes'
+)
+bpy.types.Scene.rmtc_parallel_workers = bpy.props.IntProperty(
+    name="Workers",
+    default=4,
+    min=1,
+    max=64,
+    description='Number of background Blender workers used by a parallel build and pvs'
+)
+bpy.types.Scene.rmtc_profile_dir = bpy.props.StringProperty(
+    name="Build Reports",
+    subtype='DIR_PATH',
+    description='Folder for a JSON timing report of every build (empty to disable)'
+)
+bpy.types.Scene.rmtc_profile_cprofile = bpy.props.BoolProperty(
+    name="cProfile Stats",
+    default=False,
+    description='Also record cProfile stats of every build next to the JSON report'
+)
+bpy.types.Scene.rmtc_build_cache = bpy.props.BoolProperty(
+    name="Build Cache",
+    default=True,
+    description='Keep built rooms in a roomantic_cache folder next to the .blend and restore rooms with unchanged inputs from it'
+)
+bpy.types.Scene.rmtc_build_cache_size = bpy.props.IntProperty(
+    name="Cache Size (MB)",
+    default=256,
+    min=1,
+    description='Least recently used rooms are dropped from the build cache above this size'
+)
+bpy.types.Scene.rmtc_incremental_build = bpy.props.BoolProperty(
+    name="Incremental Build",
+    default=True,
+    description='Build All only rebuilds rooms whose shape or neighbours changed since the last build'
+)
 bpy.types.Object.rmtc_shape_type = bpy.props.EnumProperty(
     items=[
         ("SECTOR2D", "Sector2D", "is a 2D sector"),
@@ -570,6 +3951,27 @@ bpy.types.Object.rmtc_floor_texture_rotation = bpy.props.FloatProperty(
     step=10,
     precision=3,
 )
+bpy.types.Object.rmtc_force_exact = bpy.props.BoolProperty(
+    name="Force Exact Solver",
+    default=False,
+    description='Always carve this room with the exact solver. Set when a fast solver result failed validation'
+)
+bpy.types.Object.rmtc_fingerprint = bpy.props.StringProperty(
+    name="Fingerprint",
+    description='Hash of the shape inputs at the last build',
+    options={'HIDDEN'}
+)
+bpy.types.Object.rmtc_neighbours = bpy.props.StringProperty(
+    name="Neighbours",
+    description='Names of the shapes intersecting this one at the last build',
+    options={'HIDDEN'}
+)
+bpy.types.Object.rmtc_bounds = bpy.props.FloatVectorProperty(
+    name="Bounds",
+    description='World space bounds of the shape at the last build',
+    size=6,
+    options={'HIDDEN'}
+)
 
 
 # DATA
@@ -594,22 +3996,78 @@ class ROOManticPanel(bpy.types.Panel):
         col.label(icon="WORLD", text="Map Settings")
         col.prop(scene, "rmtc_precision")
         col.prop_search(scene, "rmtc_remove_material", bpy.data, "materials")
+        col.prop(scene, "rmtc_incremental_build")
+        col.prop(scene, "rmtc_vectorized_texture")
+        col.prop(scene, "rmtc_multi_operand")
+        col.prop(scene, "rmtc_narrow_phase")
+        col.prop(scene, "rmtc_convex_csg")
+        col.prop(scene, "rmtc_solver_policy")
+        col.prop(scene, "rmtc_weld")
+        col.prop(scene, "rmtc_vertex_cache")
+        if scene.rmtc_vertex_cache:
+            col.prop(scene, "rmtc_vertex_cache_size")
+        col.prop(scene, "rmtc_build_cache")
+        if scene.rmtc_build_cache:
+            col.prop(scene, "rmtc_build_cache_size")
+        col.prop(scene, "rmtc_live_build")
+        if scene.rmtc_live_build:
+            col.prop(scene, "rmtc_live_delay")
+            col.prop(scene, "rmtc_live_budget")
+        col.prop(scene, "rmtc_portals")
+        if scene.rmtc_portals:
+            col.prop(scene, "rmtc_pvs")
+        col.prop(scene, "rmtc_texture_atlas")
+        if scene.rmtc_texture_atlas:
+            col.prop(scene, "rmtc_atlas_size")
+            col.prop(scene, "rmtc_atlas_padding")
+        col.prop(scene, "rmtc_parallel_build")
+        if scene.rmtc_parallel_build:
+            col.prop(scene, "rmtc_parallel_workers")
         col = layout.column(align=True)
         col.operator("scene.rmtc_build", text="Build All",
                      icon="MOD_BUILD").selected_only = False
         col.operator("scene.rmtc_build", text="Build Selected",
                      icon="MOD_BUILD").selected_only = True
 
+        # profile
+        col = layout.column(align=True)
+        col.label(icon="TIME", text="Profiling")
+        col.prop(scene, "rmtc_profile_dir")
+        col.prop(scene, "rmtc_profile_cprofile")
+        if last_build_profile is not None:
+            col.label(text="Last build - {:.2f} sec.".format(
+                last_build_profile.total))
+            for stats in last_build_profile.slowest_rooms():
+                col.label(text="{} - {:.2f} sec. - {} booleans".format(
+                    stats['name'], stats['seconds'], stats['booleans']))
+            counters = last_build_profile.counters
+            if 'weld verts before' in counters:
+                col.label(text="Welding - {} -> {} verts - {} -> {} tris".format(
+                    counters['weld verts before'], counters['weld verts after'],
+                    counters['weld tris before'], counters['weld tris after']))
+            if 'acmr before' in counters:
+                col.label(text="Vertex Cache - acmr {:.2f} -> {:.2f}".format(
+                    counters['acmr before'], counters['acmr after']))
+            for stats in last_build_profile.slowest_pvs_rooms():
+                col.label(text="PVS {} - {:.2f} sec. - {} visible".format(
+                    stats['name'], stats['seconds'], stats['visible']))
+
         # tools
         col = layout.column(align=True)
         col.label(icon="SNAP_PEEL_OBJECT", text="Tools")
         col.operator("scene.rmtc_open_material",
                      text="Open Material", icon="TEXTURE")
+        col.operator("scene.rmtc_export_level",
+                     text="Export Level", icon="EXPORT")
         if bpy.context.mode == 'EDIT_MESH':
             col.operator("object.rmtc_rip_geometry", text="Rip To",
                          icon="UNLINKED").focus_to_rip = True
             col.operator("object.rmtc_rip_geometry", text="Rip Stay",
                          icon="UNLINKED").focus_to_rip = False
+            col.operator("object.rmtc_rip_islands", text="Rip Islands",
+                         icon="MOD_EXPLODE").group_by = 'ISLANDS'
+            col.operator("object.rmtc_rip_islands", text="Rip Face Sets",
+                         icon="FACE_MAPS").group_by = 'FACE_SETS'
         else:
             col.operator("scene.rmtc_new_geometry", text="New Sector2D",
                          icon="MESH_PLANE").shape_type = 'SECTOR2D'
@@ -624,6 +4082,7 @@ class ROOManticPanel(bpy.types.Panel):
             col.label(icon="MOD_ARRAY", text="Shape Properties")
             col.prop(obj, "rmtc_shape_type", text="Shape Type")
             col.prop(obj, "rmtc_shape_auto_texture", text="Auto Texture")
+            col.prop(obj, "rmtc_force_exact", text="Force Exact Solver")
             if obj.rmtc_shape_auto_texture:
                 col = layout.row(align=True)
                 col.prop(obj, "rmtc_ceiling_texture_scale_offset")
@@ -650,6 +4109,18 @@ class ROOManticPanel(bpy.types.Panel):
                                 "materials", icon="MATERIAL", text="Wall")
                 col.prop_search(obj, "rmtc_floor_texture", bpy.data,
                                 "materials", icon="MATERIAL", text="Floor")
+            # portals of the shape's room (or of the selected room itself)
+            room = obj if obj.name.startswith('rmtc_') else bpy.data.objects.get('rmtc_' + obj.name)
+            portals = get_room_portals(room)
+            if portals:
+                col = layout.column(align=True)
+                col.label(icon="OUTLINER_OB_LIGHTPROBE", text="Portals: {}".format(len(portals)))
+                for portal in portals:
+                    col.label(text="  -> {}".format(portal['room']))
+            visibleNames = get_room_pvs_names(room)
+            if visibleNames is not None:
+                col = layout.column(align=True)
+                col.label(icon="HIDE_OFF", text="PVS: {} visible rooms".format(len(visibleNames)))
 
 
 class ROOManticBuild(bpy.types.Operator):
@@ -659,6 +4130,8 @@ class ROOManticBuild(bpy.types.Operator):
     selected_only: bpy.props.BoolProperty(name="selected_only", default=False)
 
     def execute(self, context):
+        global last_build_profile
+
         # cache selected
         activeObj = context.active_object
         selectedObjs = []
@@ -671,191 +4144,18 @@ class ROOManticBuild(bpy.types.Operator):
             bpy.ops.object.mode_set(mode='OBJECT')
             wasEditMode = True
 
-        # The new algo works to achieve this goal: each shape must be its own separate object
-        # So we can no longer rely on a global level_geometry object that gets booleaned around by each shape
-        # we now need to treat each shape separately
-
         print("\nroomantic: build start")
 
-        start = time.time()
-        # cleanup
-        remove_not_used()
-
-        # make sure remove_materials is present
-        if context.scene.rmtc_remove_material == '' or context.scene.rmtc_remove_material is None or context.scene.rmtc_remove_material not in bpy.data.materials:
-            context.scene.rmtc_remove_material = create_remove_material().name
-
-        # get collection
-        levelCollection = get_add_collection(context.scene, 'ROOMantic_LEVEL')
-        levelCollection.hide_select = False
-        shapeCollection = get_add_collection(context.scene, 'ROOMantic_SHAPES')
-        shapeCollection.hide_select = False
-
-        # clear collections
-        for obj in levelCollection.objects:
-            # unlink only if selected
-            if self.selected_only:
-                fullName = obj.name.split('rmtc_')
-                if len(fullName) == 2:
-                    shapeName = fullName[1]
-                    for sel in selectedObjs:
-                        if sel.name == shapeName:
-                            unlink_collections_all(obj)
-                            continue
-            else:
-                unlink_collections_all(obj)
-
-            # if brush inside this collection, then link it to scene
-            if obj.rmtc_shape_type != 'NONE':
-                link_collection_unique(obj, context.scene.collection)
-
-        end = time.time()
-        print(
-            "roomantic: cleanup collections - {:.2g} sec.".format(end - start))
-
-        start = time.time()
-
-        # look for shapes
-        shapes = get_shapes(
-            [context.scene.collection, levelCollection, shapeCollection])
-
-        # optimizations
-        hasBrushes = False
-
-        # loop on shapes
-        for shape in shapes:
-            # if has no geom then remove
-            if len(shape.data.vertices) < 3:
-                shapes.remove(shape)
-                continue
+        profiler = BuildProfiler()
+        profiler.begin_cprofile(context.scene.rmtc_profile_cprofile)
 
-            # mark hasbrushes flag
-            if shape.rmtc_shape_type == 'BRUSH':
-                hasBrushes = True
+        # a full build replaces whatever live mode was doing
+        live_builder.clear()
 
-            # update + link shapes
-            update_shape(shape)
-            link_collection_unique(shape, shapeCollection)
-
-        end = time.time()
-        print("roomantic: setting up shapes - {:.2g} sec.".format(end - start))
-
-        start = time.time()
-
-        # cache data: shape-boolean + brush-boolean + bounds (they are just remove_material blobs)
-        shapeIntersections = {}
-        shapeBooleans = {}
-        shapeBounds = {}
-        sectorBoolean = create_mesh_obj(
-            'sectorBoolean') if hasBrushes else None
-        if hasBrushes:
-            link_collection_unique(sectorBoolean, context.scene.collection)
-
-        for shape in shapes:
-            if self.selected_only and shape not in selectedObjs:
-                continue
+        build_level_paused(context, self.selected_only,
+                           selectedObjs, profiler)
 
-            # init intersections
-            shapeIntersections[shape] = []
-
-            # shapeBool
-            shapeBoolean = eval_shape(shape, 'boolean_')
-            make_shape_boolean(shapeBoolean)
-            shapeBooleans[shape] = shapeBoolean
-
-            # bounds
-            shapeBounds[shape] = calculate_bounds_ws(
-                shape.matrix_world, shapeBoolean.data, 0.1)
-
-            # brushBool
-            if hasBrushes:
-                if shape.rmtc_shape_type != 'BRUSH':
-                    apply_csg(sectorBoolean, shapeBoolean, 'UNION')
-
-        end = time.time()
-        print(
-            "roomantic: caching shape data - {:.2g} sec.".format(end - start))
-
-        start = time.time()
-
-        # shape intersect map
-        for shape0 in shapes:
-            if self.selected_only and shape0 not in selectedObjs:
-                continue
-
-            # loop for each other shape
-            for shape1 in shapes:
-                if shape0 == shape1:
-                    continue
-
-                # if shape is already intersecting then just ignore
-                if shape1 in shapeIntersections[shape0]:
-                    continue
-
-                # check if valid
-                if shape0 not in shapeBounds or shape1 not in shapeBounds:
-                    continue
-
-                # check intersection and add both ways
-                if shapeBounds[shape0].intersect(shapeBounds[shape1]):
-                    # add other to current
-                    shapeIntersections[shape0].append(shape1)
-                    # add current to other
-                    if shape0 not in shapeIntersections[shape1]:
-                        shapeIntersections[shape1].append(shape0)
-
-        end = time.time()
-        print(
-            "roomantic: creatin shape intersection tables - {:.2g} sec.".format(end - start))
-
-        start = time.time()
-
-        # create/duplicate shapes to output
-        for shape0 in shapes:
-            if self.selected_only and shape0 not in selectedObjs:
-                continue
-
-            # eval shape
-            evaluatedShape = eval_shape(shape0, 'rmtc_')
-            evaluatedShape.display_type = 'TEXTURED'
-            copy_materials(shape0, evaluatedShape)
-
-            # add remove_material
-            removeMaterialIndex = len(evaluatedShape.data.materials)
-            set_material_slots_size(evaluatedShape, len(
-                evaluatedShape.data.materials) + 1)
-            evaluatedShape.data.materials[removeMaterialIndex] = bpy.data.materials[context.scene.rmtc_remove_material]
-
-            # link
-            link_collection_unique(evaluatedShape, levelCollection)
-
-            # apply csg
-            if shape0.rmtc_shape_type == 'BRUSH':
-                for shape1 in shapeIntersections[shape0]:
-                    if shape1.rmtc_shape_type == 'BRUSH':
-                        apply_csg(evaluatedShape,
-                                  shapeBooleans[shape1], 'UNION')
-                    else:
-                        apply_csg(evaluatedShape, sectorBoolean, 'INTERSECT')
-            else:
-                for shape1 in shapeIntersections[shape0]:
-                    apply_csg(evaluatedShape, shapeBooleans[shape1], 'UNION')
-                flip_normals(evaluatedShape)
-
-            apply_remove_material(evaluatedShape)
-
-            apply_triangulate(evaluatedShape)
-
-            if shape0.rmtc_shape_type == 'SECTOR2D' or shape0.rmtc_shape_auto_texture:
-                apply_auto_texture(shape0, evaluatedShape)
-
-        end = time.time()
-        print("roomantic: performing csg - {:.2g} sec.".format(end - start))
-
-        start = time.time()
-
-        # mark unselectable
-        levelCollection.hide_select = True
+        profiler.begin('final cleanup')
 
         # restore context
         bpy.ops.object.select_all(action='DESELECT')
@@ -868,12 +4168,12 @@ class ROOManticBuild(bpy.types.Operator):
         if wasEditMode:
             bpy.ops.object.mode_set(mode='EDIT')
 
-        # unlink sectorBoolean
-        if hasBrushes:
-            unlink_collections_all(sectorBoolean)
+        profiler.finish()
 
-        end = time.time()
-        print("roomantic: final cleanup - {:.2g} sec.".format(end - start))
+        if context.scene.rmtc_profile_dir != '':
+            profiler.write_report(bpy.path.abspath(
+                context.scene.rmtc_profile_dir))
+        last_build_profile = profiler
 
         return {"FINISHED"}
 
@@ -963,6 +4263,32 @@ class ROOManticOpenMaterial(bpy.types.Operator, ImportHelper):
         return {"FINISHED"}
 
 
+class ROOManticExportLevel(bpy.types.Operator, ExportHelper):
+    bl_idname = "scene.rmtc_export_level"
+    bl_label = "Export Level"
+
+    filename_ext = ".rmtc"
+    filter_glob: bpy.props.StringProperty(
+        default="*.rmtc",
+        options={'HIDDEN'})
+
+    def execute(self, context):
+        rooms = get_level_rooms()
+        if len(rooms) == 0:
+            self.report({'WARNING'}, "no built rooms to export")
+            return {"CANCELLED"}
+
+        start = time.time()
+        export_level(self.filepath, rooms)
+        if bpy.data.collections['ROOMantic_LEVEL'].get('rmtc_stale'):
+            self.report({'WARNING'}, "exported {} rooms, rooms rebuilt by live build have no portals, pvs or atlas until the next Build All".format(
+                len(rooms)))
+            return {"FINISHED"}
+        self.report({'INFO'}, "exported {} rooms in {:.3f} sec.".format(
+            len(rooms), time.time() - start))
+        return {"FINISHED"}
+
+
 class ROOManticRipGeometry(bpy.types.Operator):
     bl_idname = "object.rmtc_rip_geometry"
     bl_label = "Rip Geometry"
@@ -987,57 +4313,16 @@ class ROOManticRipGeometry(bpy.types.Operator):
             activeObjBM.free()
             return {"CANCELLED"}
 
-        ripedObjBM = bmesh.new()
-        pyVerts = []
-        pyFaces = []
-
-        # rip-copy faces
-        for f in selectedFaces:
-            currentFaceIndices = []
-            for v in f.verts:
-                if v not in pyVerts:
-                    pyVerts.append(v)
-                currentFaceIndices.append(pyVerts.index(v))
-
-            pyFaces.append(currentFaceIndices)
-
-        # create mesh
-        ripedMesh = bpy.data.meshes.new(name='riped_mesh')
-        if len(pyFaces) > 0:
-            ripedMesh.from_pydata([x.co for x in pyVerts], [], pyFaces)
+        ripedObj = rip_faces(activeObj, selectedFaces)
 
         # remove from riped
-        if activeObj.rmtc_shape_type == 'SECTOR2D' and len(selectedFaces) > 0:
-            edgesToRemove = []
-            for f in selectedFaces:
-                for e in f.edges:
-                    if e not in edgesToRemove:
-                        edgesToRemove.append(e)
-
-            for f in selectedFaces:
-                activeObjBM.faces.remove(f)
-
-            for e in edgesToRemove:
-                if e.is_wire:
-                    activeObjBM.edges.remove(e)
-
-            for v in activeObjBM.verts:
-                if len(v.link_edges) == 0 or len(v.link_faces) == 0:
-                    activeObjBM.verts.remove(v)
+        remove_riped_faces(activeObj, activeObjBM, selectedFaces)
 
         activeObjBM.verts.ensure_lookup_table()
         activeObjBM.edges.ensure_lookup_table()
         activeObjBM.faces.ensure_lookup_table()
 
-        # create object
-        ripedObj = activeObj.copy()
-        for col in activeObj.users_collection:
-            col.objects.link(ripedObj)
-        ripedObj.data = ripedMesh
-        copy_materials(activeObj, ripedObj)
-
         activeObjBM.free()
-        ripedObjBM.free()
 
         # deselect eveything
         bpy.ops.mesh.select_all(action='DESELECT')
@@ -1058,6 +4343,70 @@ class ROOManticRipGeometry(bpy.types.Operator):
         return {"FINISHED"}
 
 
+class ROOManticRipIslands(bpy.types.Operator):
+    bl_idname = "object.rmtc_rip_islands"
+    bl_label = "Rip Islands"
+
+    group_by: bpy.props.EnumProperty(
+        items=[
+            ("ISLANDS", "Islands", "one shape per connected island of selected faces"),
+            ("FACE_SETS", "Face Sets", "one shape per sculpt face set of the selected faces"),
+        ],
+        name="group_by",
+        default='ISLANDS')
+
+    def execute(self, context):
+        activeObj = context.active_object
+
+        activeObjBM = bmesh.from_edit_mesh(activeObj.data)
+        activeObjBM.faces.ensure_lookup_table()
+
+        selectedFaces = [x for x in activeObjBM.faces if x.select]
+
+        # early out
+        if len(selectedFaces) == 0:
+            activeObjBM.free()
+            return {"CANCELLED"}
+
+        if self.group_by == 'FACE_SETS':
+            # face sets are only a generic attribute (readable from bmesh) since 3.5
+            if bpy.app.version < (3, 5, 0):
+                self.report({'ERROR'}, "splitting by face set needs Blender 3.5 or newer")
+                activeObjBM.free()
+                return {"CANCELLED"}
+            groups = get_face_sets(activeObjBM, selectedFaces)
+            if groups is None:
+                self.report({'WARNING'}, "mesh has no face sets")
+                activeObjBM.free()
+                return {"CANCELLED"}
+        else:
+            groups = get_face_islands(selectedFaces)
+
+        # a sector2d ripped whole keeps its first group
+        if activeObj.rmtc_shape_type == 'SECTOR2D' and len(selectedFaces) == len(activeObjBM.faces):
+            groups = groups[1:]
+
+        ripedObjs = []
+        for faces in groups:
+            ripedObjs.append(rip_faces(activeObj, faces))
+            remove_riped_faces(activeObj, activeObjBM, faces)
+
+        activeObjBM.free()
+
+        # deselect eveything
+        bpy.ops.mesh.select_all(action='DESELECT')
+        bpy.ops.object.mode_set(mode='OBJECT')
+        bpy.ops.object.select_all(action='DESELECT')
+
+        for ripedObj in ripedObjs:
+            ripedObj.select_set(True)
+        activeObj.select_set(True)
+        bpy.context.view_layer.objects.active = activeObj
+
+        self.report({'INFO'}, "ripped {} shapes".format(len(ripedObjs)))
+        return {"FINISHED"}
+
+
 # CLASSES
 
 
@@ -1066,7 +4415,13 @@ def register():
     bpy.utils.register_class(ROOManticBuild)
     bpy.utils.register_class(ROOManticNewGeometry)
     bpy.utils.register_class(ROOManticOpenMaterial)
+    bpy.utils.register_class(ROOManticExportLevel)
     bpy.utils.register_class(ROOManticRipGeometry)
+    bpy.utils.register_class(ROOManticRipIslands)
+    bpy.app.handlers.depsgraph_update_post.append(_on_depsgraph_update)
+    bpy.app.handlers.load_post.append(_on_registry_reset)
+    bpy.app.handlers.undo_post.append(_on_registry_reset)
+    bpy.app.handlers.redo_post.append(_on_registry_reset)
 
 
 def unregister():
@@ -1074,8 +4429,99 @@ def unregister():
     bpy.utils.unregister_class(ROOManticBuild)
     bpy.utils.unregister_class(ROOManticNewGeometry)
     bpy.utils.unregister_class(ROOManticOpenMaterial)
+    bpy.utils.unregister_class(ROOManticExportLevel)
     bpy.utils.unregister_class(ROOManticRipGeometry)
+    bpy.utils.unregister_class(ROOManticRipIslands)
+    bpy.app.handlers.depsgraph_update_post.remove(_on_depsgraph_update)
+    bpy.app.handlers.load_post.remove(_on_registry_reset)
+    bpy.app.handlers.undo_post.remove(_on_registry_reset)
+    bpy.app.handlers.redo_post.remove(_on_registry_reset)
+    if bpy.app.timers.is_registered(_live_build_tick):
+        bpy.app.timers.unregister(_live_build_tick)
+
+
+def main(argv):
+    # command line, arguments after '--':
+    # blender --background [file.blend] --python roomantic.py -- <args>
+    parser = argparse.ArgumentParser(prog='roomantic')
+    parser.add_argument('--worker', metavar='JOB',
+                        help='build the rooms of a parallel build job (internal)')
+    parser.add_argument('--pvs-worker', metavar='JOB',
+                        help='flow the rooms of a parallel pvs job (internal)')
+    parser.add_argument('--generate', type=int, metavar='N',
+                        help='generate a level of N shapes')
+    parser.add_argument('--layout', default='GRID', choices=['GRID', 'CORRIDOR'],
+                        help='layout of generated levels')
+    parser.add_argument('--build', nargs='?', const='', metavar='BLEND',
+                        help='build the given .blend (or the open file)')
+    parser.add_argument('--benchmark', metavar='SIZES',
+                        help='comma separated level sizes to generate, build and time')
+    parser.add_argument('--reference', default='',
+                        help='benchmark report whose checksums must match')
+    parser.add_argument('--report', default='',
+                        help='folder for build/benchmark JSON reports')
+    parser.add_argument('--parallel', type=int, default=0, metavar='WORKERS',
+                        help='build with this many background workers')
+    parser.add_argument('--full', action='store_true',
+                        help='rebuild every room instead of an incremental build')
+    parser.add_argument('--save', action='store_true',
+                        help='save the .blend after building')
+    parser.add_argument('--output', default='',
+                        help='save the .blend to this path after building/generating')
+    parser.add_argument('--export', default='', metavar='PATH',
+                        help='write the built rooms to a .rmtc level file')
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        run_build_worker(args.worker)
+        return
+    if args.pvs_worker is not None:
+        run_pvs_worker(args.pvs_worker)
+        return
+
+    if args.build:
+        bpy.ops.wm.open_mainfile(filepath=args.build)
+
+    context = bpy.context
+    if args.parallel > 0:
+        context.scene.rmtc_parallel_build = True
+        context.scene.rmtc_parallel_workers = args.parallel
+    if args.full:
+        context.scene.rmtc_incremental_build = False
+
+    if args.benchmark is not None:
+        sizes = [int(size) for size in args.benchmark.split(',')]
+        mismatches = run_benchmark(
+            context, sizes, args.layout, args.report, args.reference)
+        if len(mismatches) > 0:
+            sys.exit(1)
+        return
+
+    if args.generate is not None:
+        generate_level(context.scene, args.generate, args.layout)
+
+    if args.build is not None:
+        profiler = BuildProfiler()
+        build_level_paused(context, False, [], profiler)
+        profiler.finish()
+        if args.report != '':
+            profiler.write_report(args.report)
+        print("roomantic: level checksum - " +
+              level_checksum(bpy.data.collections['ROOMantic_LEVEL']))
+
+    if args.export != '':
+        export_level(args.export, get_level_rooms())
+        levelCollection = bpy.data.collections.get('ROOMantic_LEVEL')
+        if levelCollection is not None and levelCollection.get('rmtc_stale'):
+            print("roomantic: rooms rebuilt by live build have no portals, pvs or atlas, run --build first")
+
+    if args.output != '':
+        bpy.ops.wm.save_as_mainfile(filepath=args.output)
+    elif args.save:
+        bpy.ops.wm.save_mainfile()
 
 
 if __name__ == "__main__":
     register()
+    if '--' in sys.argv:
+        main(sys.argv[sys.argv.index('--') + 1:])
@@ -0,0 +1,34 @@
+import os
+import sys
+import types
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# outside blender: stand-ins for the blender modules, enough to import the add-on
+# and run its numpy kernels
+try:
+    import bpy  # noqa: F401
+except ImportError:
+    bpy = MagicMock()
+    bpy.types = types.SimpleNamespace(
+        Operator=type('Operator', (), {}),
+        Panel=type('Panel', (), {}),
+        Scene=MagicMock(),
+        Object=MagicMock(),
+        OperatorFileListElement=MagicMock(),
+    )
+    bpy.app.handlers.persistent = lambda function: function
+    bpy.app.background = False
+
+    ioUtils = types.ModuleType('bpy_extras.io_utils')
+    ioUtils.ImportHelper = type('ImportHelper', (), {})
+    ioUtils.ExportHelper = type('ExportHelper', (), {})
+    bpyExtras = types.ModuleType('bpy_extras')
+    bpyExtras.io_utils = ioUtils
+
+    sys.modules['bpy'] = bpy
+    sys.modules['bmesh'] = MagicMock()
+    sys.modules['mathutils'] = MagicMock()
+    sys.modules['bpy_extras'] = bpyExtras
+    sys.modules['bpy_extras.io_utils'] = ioUtils
@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+import pytest
+
+import roomantic
+
+
+def staggered_portals(windows):
+    # rooms in a row along x, wall k between room k and k + 1 with a window
+    # spanning the given y range, a portal each way through every window
+    portalFrom = []
+    portalTo = []
+    portalPoints = []
+    portalPlanes = []
+    roomPortals = [[] for i in range(len(windows) + 1)]
+    for k, (low, high) in enumerate(windows):
+        x = k + 1.0
+        points = np.array([[x, low, 0], [x, high, 0], [x, high, 1], [x, low, 1]])
+        for room, to, side in ((k, k + 1, 1.0), (k + 1, k, -1.0)):
+            roomPortals[room].append(len(portalFrom))
+            portalFrom.append(room)
+            portalTo.append(to)
+            portalPoints.append(points if side > 0 else points[::-1].copy())
+            portalPlanes.append([side, 0, 0, side * x])
+    portals = (portalFrom, portalTo, portalPoints, np.array(portalPlanes), roomPortals)
+    return portals, roomantic.get_portal_might_see(portals, len(roomPortals), 0.0001)
+
+
+def get_rows(visible):
+    return [''.join('1' if bit else '0' for bit in row) for row in visible]
+
+
+def test_pvs_stops_at_staggered_windows():
+    portals, mightRooms = staggered_portals([(0, 0.1), (0.9, 1), (0, 0.1)])
+    visible = [roomantic.get_room_pvs(i, portals, mightRooms, 4, 0.0001) for i in range(4)]
+    assert get_rows(visible) == ['1110', '1111', '1111', '0111']
+
+
+@pytest.mark.parametrize('windows', [[], [(0, 0.1), (0.9, 1), (0, 0.1)]])
+def test_pvs_worker_matches_serial_flow(tmp_path, windows):
+    portals, mightRooms = staggered_portals(windows)
+    roomCount = len(windows) + 1
+    portalsPath = str(tmp_path / 'portals.npz')
+    roomantic.save_pvs_portals(portalsPath, portals, mightRooms)
+    job = {'portals': portalsPath, 'output': str(tmp_path / 'pvs.npz'),
+           'eps': 0.0001, 'rooms': list(range(roomCount))[::-1]}
+    jobPath = tmp_path / 'job.json'
+    jobPath.write_text(json.dumps(job))
+
+    roomantic.run_pvs_worker(str(jobPath))
+    with np.load(job['output']) as arrays:
+        visible = arrays['visible']
+    expected = [roomantic.get_room_pvs(i, portals, mightRooms, roomCount, 0.0001)
+                for i in job['rooms']]
+    assert get_rows(visible) == get_rows(expected)
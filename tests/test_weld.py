@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+import roomantic
+
+
+def get_edge_face_counts(arrays):
+    loopTotals = arrays['loop_totals']
+    loopVerts = arrays['loop_verts']
+    loopStarts = np.cumsum(loopTotals) - loopTotals
+    following = np.arange(1, len(loopVerts) + 1)
+    following[loopStarts + loopTotals - 1] = loopStarts
+    edges = np.sort(np.column_stack((loopVerts, loopVerts[following])), axis=1)
+    _, counts = np.unique(edges, axis=0, return_counts=True)
+    return counts
+
+
+def split_cube(origin):
+    # unit cube, the top face split at the middle of its front edge,
+    # a zero area triangle closes the t-junction with the front face
+    co = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+                   [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1],
+                   [0.5, 0, 1]], dtype=np.float64) + origin
+    tris = [[0, 2, 1], [0, 3, 2],
+            [0, 1, 5], [0, 5, 4],
+            [1, 2, 6], [1, 6, 5],
+            [2, 3, 7], [2, 7, 6],
+            [3, 0, 4], [3, 4, 7],
+            [4, 8, 7], [8, 6, 7], [8, 5, 6],
+            [4, 5, 8]]
+    return co, np.array(tris)
+
+
+def unwelded_arrays(co, tris, jitter):
+    # every triangle with its own copies of the corners, moved by less than the tolerance
+    rng = np.random.default_rng(1)
+    corners = co[tris.ravel()] + rng.uniform(-jitter, jitter, (tris.size, 3))
+    return {
+        'co': corners,
+        'loop_totals': np.full(len(tris), 3, dtype=np.int32),
+        'loop_verts': np.arange(tris.size, dtype=np.int32),
+        'material_indices': np.zeros(len(tris), dtype=np.int32),
+        'smooth': np.zeros(len(tris), dtype=bool),
+        'uv': rng.uniform(0, 1, (tris.size, 2)),
+    }
+
+
+@pytest.mark.parametrize('origin', [0.0, 0.00005, 12.34565])
+def test_weld_keeps_room_closed(origin):
+    co, tris = split_cube(origin)
+    welded, counts = roomantic.weld_mesh_arrays(
+        unwelded_arrays(co, tris, 0.000001), 0.0001)
+
+    assert (get_edge_face_counts(welded) == 2).all()
+    assert counts['verts_after'] == len(co)
+    assert counts['tris_after'] == len(tris)
+
+
+def test_weld_drops_collapsed_and_duplicate_triangles():
+    co, tris = split_cube(0.0)
+    # a sliver with a short edge on the cube's corner + the first triangle again
+    co = np.vstack((co, [[0.00002, 0, 0]]))
+    tris = np.vstack((tris, [[0, 1, 9], tris[0]]))
+    welded, counts = roomantic.weld_mesh_arrays(
+        unwelded_arrays(co, tris, 0.0), 0.0001)
+
+    assert (get_edge_face_counts(welded) == 2).all()
+    assert counts['tris_after'] == len(tris) - 2
+
+
+@pytest.mark.parametrize('first, second, tolerance', [
+    (0.6, 0.7, 0.05), (0.57, 0.58, 0.005), (0.008, 0.009, 0.0005)])
+def test_weld_keeps_precision_steps_apart(first, second, tolerance):
+    # vertices snapped one precision step apart, welded at half a step
+    co = np.array([[first, 0, 0], [second, 0, 0], [first, 1, 0]])
+    pairsA, pairsB = roomantic.get_close_pairs(co, tolerance)
+    assert len(pairsA) == 0
+
+    welded, counts = roomantic.weld_mesh_arrays(
+        unwelded_arrays(co, np.array([[0, 1, 2]]), 0.0), tolerance)
+    assert counts['verts_after'] == 3
+    assert counts['tris_after'] == 1
+
+
+def test_weld_merges_pairs_across_cells():
+    # both points of the pair come after another point of their cell,
+    # the pair straddles the cell border at x = 0.001
+    co = np.array([[0.0002, 0, 0], [0.00099, 0, 0],
+                   [0.0018, 0, 0], [0.00101, 0, 0]])
+    pairsA, pairsB = roomantic.get_close_pairs(co, 0.001)
+    pairs = set(zip(np.minimum(pairsA, pairsB).tolist(), np.maximum(pairsA, pairsB).tolist()))
+    assert (1, 3) in pairs
+    assert (0, 2) not in pairs
+
+    co, tris = split_cube(0.0)
+    arrays = unwelded_arrays(co, tris, 0.0)
+    arrays['co'][1::3] += [0.00002, 0, 0]
+    welded, counts = roomantic.weld_mesh_arrays(arrays, 0.0001)
+    assert (get_edge_face_counts(welded) == 2).all()
+    assert counts['verts_after'] == len(co)